@@ -6,9 +6,16 @@
 """
 
 from pylevel import error
+from pylevel import cache
 from pylevel import utilities
 from pylevel import datasets
+from pylevel import storage
+from pylevel import projection
 
 ## Import
 from pylevel import data
+from pylevel import initialisation
+from pylevel import tables
+from pylevel import query
 from pylevel import wrapper
+from pylevel import service
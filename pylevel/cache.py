@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+""" Cache module keeping decoded arrays in memory. """
+
+import attr
+import numpy
+import typing
+import collections
+
+
+__license__ = "MIT"
+__status__ = "Development"
+
+
+@attr.s
+class LRUCache:
+    """ Least recently used cache of arrays bounded by a byte budget.
+
+        Note:
+            Cached arrays are returned read-only since they are shared
+            between callers. Arrays larger than the budget are not cached.
+            Other objects exposing nbytes (e.g. interpolators) are cached
+            as they are.
+
+    """
+    ## Byte budget of all cached arrays
+    max_bytes = attr.ib(default=2**26, type=int)
+
+    ## Cached arrays in order of last access (oldest first)
+    entries = attr.ib(factory=collections.OrderedDict, type=typing.Dict)
+
+    ## Bytes of all cached arrays
+    nbytes = attr.ib(default=0, type=int)
+
+    ## Lookup counters
+    hits = attr.ib(default=0, type=int)
+    misses = attr.ib(default=0, type=int)
+
+    def get(self, key, load : typing.Callable[[], typing.Any]) -> typing.Any:
+        """ Return cached array (or object) of key or load, cache and return it. """
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        self.misses += 1
+        array = load()
+        if isinstance(array, numpy.ndarray) or not hasattr(array, 'nbytes'):
+            array = numpy.asarray(array)
+            array.flags.writeable = False
+
+        if array.nbytes <= self.max_bytes:
+            self.entries[key] = array
+            self.nbytes += array.nbytes
+            self._evict()
+        return array
+
+    def invalidate(self, key=None):
+        """ Remove key from cache (all keys if None). """
+        if key is None:
+            self.entries.clear()
+            self.nbytes = 0
+        elif key in self.entries:
+            self.nbytes -= self.entries.pop(key).nbytes
+
+    def _evict(self):
+        """ Remove least recently used arrays until within byte budget. """
+        while self.nbytes > self.max_bytes:
+            _, array = self.entries.popitem(last=False)
+            self.nbytes -= array.nbytes
+
+    def stats(self) -> typing.Dict[str, int]:
+        """ Return cache counters and usage. """
+        return dict(hits=self.hits,
+                    misses=self.misses,
+                    entries=len(self.entries),
+                    nbytes=self.nbytes,
+                    max_bytes=self.max_bytes)
@@ -15,7 +15,6 @@ import numpy
 import typing
 import dask.array
 import hdf5storage
-from scipy.interpolate import interpn
 
 import pylevel
 
@@ -60,6 +59,18 @@ class Grid:
     boundary = attr.ib(default=None, type=typing.Optional[typing.List])
     ## Convenience variable ds dimensional
     vs = attr.ib(default=None, type=typing.Optional[numpy.ndarray])
+    ## Periodicity of each dimension (resolved from boundary condition)
+    periodic = attr.ib(default=None, type=typing.Optional[numpy.ndarray])
+    ## Periodic dimensions and their periods (resolved on initialisation)
+    periodic_axes = attr.ib(default=None, type=typing.Optional[numpy.ndarray])
+    period = attr.ib(default=None, type=typing.Optional[numpy.ndarray])
+    ## Periodic dimensions with bounds and period as floats for single states
+    periodic_bounds = attr.ib(default=None, type=typing.Optional[typing.List[tuple]])
+    ## Inverse grid step and flat (C order) strides in elements (resolved on initialisation)
+    inv_dx = attr.ib(default=None, type=typing.Optional[numpy.ndarray])
+    flat_strides = attr.ib(default=None, type=typing.Optional[numpy.ndarray])
+    ## Maximum index as unsigned integers (negative indices wrap above it)
+    index_limit = attr.ib(default=None, type=typing.Optional[numpy.ndarray])
     ## Enable debugging
     debug_is_enabled = attr.ib(default=False, type=bool)
     ## Show configuration
@@ -74,38 +85,91 @@ class Grid:
     # self.shape = tuple(g[10][0].tolist())
 
     def __attrs_post_init__(self):
-        """ Initialise from MATLAB *.mat file. """
+        """ Initialise from MATLAB *.mat file (or metadata without data handle). """
         self.debug('Grid initialising')
         self.debug('Received data handle: ', self.data_handle)
 
-        self.debug('Initialising grid...')
-        self.grid = self.data_handle['/data/grid']
-        self.dim = self._initialise_field('dim').astype(int)
-        self.dx = self._initialise_field('dx')
-        self.x_min = self._initialise_field('min')
-        self.x_max = self._initialise_field('max')
+        if self.data_handle is not None:
+            self._initialise_from_data()
 
         ## Maximum index along each dimension
         self.index_min = numpy.zeros(self.dx.shape).flatten()
         ## TODO: Verify maximum index as len - 1
         self.index_max = numpy.divide(self.x_max - self.x_min, self.dx).astype(int)
-        self.N = self._initialise_field('N').astype(int)
 
         self.N_data = numpy.prod(self.N)
 
+        if self.periodic is None:
+            self.periodic = numpy.zeros(self.dx.shape, dtype=bool)
+        self.periodic_axes = numpy.flatnonzero(self.periodic)
+        self.period = self.x_max - self.x_min
+        self.periodic_bounds = [
+                (int(axis), float(self.x_min[axis]), float(self.x_max[axis]), float(self.period[axis]))
+                for axis in self.periodic_axes]
+
+        self.inv_dx = 1.0 / self.dx
+        self.index_limit = self.index_max.astype(numpy.uintp)
+        self.flat_strides = numpy.append(
+                numpy.cumprod(self.N[:0:-1])[::-1], 1).astype(numpy.intp)
+
         ## TODO: Decide and time complexity that is bearable
         # for single desktop workstation
         if self.N_data > 20000:
             print('WARNING: Complexity is very high ({})'.format(self.N_data))
 
+        if self.show_config:
+            self.print_config()
+
+    def _initialise_from_data(self):
+        """ Initialise grid fields from HDF5 data handle. """
+        self.debug('Initialising grid...')
+        self.grid = self.data_handle['/data/grid']
+        self.dim = self._initialise_field('dim').astype(int)
+        self.dx = self._initialise_field('dx')
+        self.x_min = self._initialise_field('min')
+        self.x_max = self._initialise_field('max')
+        self.N = self._initialise_field('N').astype(int)
+
         ## Initialise using loadmat to parse MATLAB cell array
         self.boundary = hdf5storage.read(path='/data/grid/bdry/', filename=self.data_path)
 
         ## Initialise using loadmat to parse MATLAB cell array
         self.vs = hdf5storage.read(path='/data/grid/vs/', filename=self.data_path)
 
-        if self.show_config:
-            self.print_config()
+        self.periodic = numpy.array([
+            "addGhostPeriodic" in self.boundary[dim][0][0][3][0][0][0][0]
+            for dim in range(len(self.dx))])
+
+    @classmethod
+    def from_metadata(cls, metadata : typing.Dict, **kwargs) -> 'Grid':
+        """ Return grid from metadata (see metadata) without HDF5 data. """
+        return cls(
+                data_handle=None,
+                data_path=None,
+                dim=numpy.array(metadata['dim'], dtype=int),
+                dx=numpy.array(metadata['dx'], dtype=float),
+                x_min=numpy.array(metadata['x_min'], dtype=float),
+                x_max=numpy.array(metadata['x_max'], dtype=float),
+                N=numpy.array(metadata['N'], dtype=int),
+                periodic=numpy.array(metadata['periodic'], dtype=bool),
+                **kwargs)
+
+    def metadata(self) -> typing.Dict:
+        """ Return JSON serialisable grid specification. """
+        return dict(
+                dim=int(self.dim),
+                dx=self.dx.tolist(),
+                x_min=self.x_min.tolist(),
+                x_max=self.x_max.tolist(),
+                N=self.N.tolist(),
+                periodic=self.periodic.tolist())
+
+    def __getstate__(self):
+        """ Return picklable state without HDF5 handles (e.g. for worker processes). """
+        state = self.__dict__.copy()
+        state['data_handle'] = None
+        state['grid'] = None
+        return state
 
     def _index_in_grid(self, index):
         """ Return true if all elements satisfy grid resolution. """
@@ -174,7 +238,7 @@ class Grid:
 
     def _is_dimension_periodic(self, dim: None) ->  bool:
         """ Return if grid dimension is labeled periodic in MATLAB. """
-        return "addGhostPeriodic" in self.boundary[dim][0][0][3][0][0][0][0]
+        return bool(self.periodic[dim])
 
     def debug(self, *args):
         """ Print debug messages if debugging is enabled. """
@@ -182,30 +246,85 @@ class Grid:
             print("LevelSetWrapper: ", *args)
 
     def _handle_periodic(self, x : numpy.ndarray) -> numpy.ndarray:
-        """ Return state x but with periodic values mapped to gridded region """
-        for i, value in enumerate(x):
-            if self._is_dimension_periodic(i):
-                period = max(self.vs[i]) - min(self.vs[i])
-                period = self.x_max[i] - self.x_min[i]
-                if x[i] < self.x_min[i]:
-                    while x[i] < self.x_min[i]:
-                        x[i] += period
-                if x[i] > self.x_max[i]:
-                    while x[i] > self.x_max[i]:
-                        x[i] -= period
+        """ Return state x but with periodic values mapped to gridded region
+
+            Note:
+                Modifies x in place, same mapping as _handle_periodic_batch.
+        """
+        for axis, x_min, x_max, period in self.periodic_bounds:
+            value = x[axis]
+            if value < x_min:
+                x[axis] = x_min + (value - x_min) % period
+            elif value > x_max:
+                x[axis] = x_max - (x_max - value) % period
         return x
 
+    def _handle_periodic_batch(self, states : numpy.ndarray) -> numpy.ndarray:
+        """ Return copy of states (N x d) with periodic values mapped to gridded region.
+
+            Note:
+                Values below x_min are mapped to [x_min, x_max), values above
+                x_max to (x_min, x_max] and values in range are unchanged.
+        """
+        states = numpy.array(states, dtype=float, ndmin=2)
+        if len(self.periodic_axes) == 0:
+            return states
+
+        axes = self.periodic_axes
+        x_min, x_max, period = self.x_min[axes], self.x_max[axes], self.period[axes]
+        values = states[:, axes]
+        values = numpy.where(values < x_min, x_min + numpy.mod(values - x_min, period), values)
+        values = numpy.where(values > x_max, x_max - numpy.mod(x_max - values, period), values)
+        states[:, axes] = values
+        return states
+
+    def index_batch(self, states : numpy.ndarray) \
+            -> typing.Tuple[numpy.ndarray, numpy.ndarray]:
+        """ Return grid indices (N x d) of states and mask of rows in grid.
+
+            Note:
+                Vectorised counterpart of index_valid, which instead of raising
+                IndexNotInGridError marks out-of-grid rows as False in the mask.
+
+        """
+        states = self._handle_periodic_batch(states)
+        indices = self.indices_from_states(states)
+        mask = (indices.astype(numpy.uintp) <= self.index_limit).all(axis=1)
+        return indices, mask
+
+    def flat_index_batch(self, states : numpy.ndarray) \
+            -> typing.Tuple[numpy.ndarray, numpy.ndarray]:
+        """ Return flat (C order) grid indices (N) of states and mask of rows in grid.
+
+            Note:
+                Gather table values with numpy.take(table, flat[mask]), which
+                avoids the tuple of index arrays of fancy indexing.
+        """
+        indices, mask = self.index_batch(states)
+        return indices @ self.flat_strides, mask
+
+    def _index_array(self, x : numpy.ndarray) -> numpy.ndarray:
+        """ Return grid index (d) of state as integer array. """
+        x = self._handle_periodic(x)
+        return numpy.rint((x.ravel() - self.x_min) * self.inv_dx).astype(numpy.intp)
+
     def index(self, x : numpy.ndarray) -> tuple:
         """ Return grid index of state rounded to next grid index. """
-        x = self._handle_periodic(x)
-        index = (x.ravel() - self.x_min) / self.dx
-        return tuple([(round(idx)) for idx in index])
+        return tuple(self._index_array(x).tolist())
 
     def index_valid(self, x : numpy.ndarray) -> tuple:
         """ Return only valid indices that exist in current grid. """
-        index = self.index(x)
+        return tuple(self._valid_index_array(x).tolist())
 
-        if not self._index_in_grid(index):
+    def flat_index_valid(self, x : numpy.ndarray) -> int:
+        """ Return flat (C order) grid index of state (see index_valid). """
+        return int(self._valid_index_array(x) @ self.flat_strides)
+
+    def _valid_index_array(self, x : numpy.ndarray) -> numpy.ndarray:
+        """ Return grid index (d) of state as integer array if in grid. """
+        index = self._index_array(x)
+
+        if not (index.astype(numpy.uintp) <= self.index_limit).all():
             # Fail silently (see below for analysing new state set implementations)
             # print('Received index request: ', index)
             # print('Permitted (min | max): ({} | {})'.format(self.index_min, self.index_max))
@@ -219,6 +338,221 @@ class Grid:
         """ Return state of grid index. """
         return numpy.array(index * self.dx + self.x_min)
 
+    def states_from_indices(self, indices : numpy.ndarray) -> numpy.ndarray:
+        """ Return states (N x d) of grid indices (N x d). """
+        return numpy.asarray(indices) * self.dx + self.x_min
+
+    def indices_from_states(self, states : numpy.ndarray) -> numpy.ndarray:
+        """ Return grid indices (N x d) of states (N x d) rounded to next grid index.
+
+            Note:
+                Neither maps periodic dimensions nor checks grid bounds,
+                see index_batch for both.
+        """
+        return numpy.rint((numpy.asarray(states) - self.x_min) * self.inv_dx).astype(numpy.intp)
+
+    def interpolate(self,
+            table : numpy.ndarray,
+            states : numpy.ndarray,
+            fill_value : float = numpy.nan) -> numpy.ndarray:
+        """ Return multilinear interpolation of grid table (N_1, ..., N_d) at states (N x d).
+
+            Note:
+                Periodic dimensions wrap with period N * dx between the last
+                and first grid point (see augmentPeriodicData.m in helperOC).
+                States outside of non-periodic dimensions return fill_value.
+                Infinite corners (e.g. unreachable min_ttr) with non-zero
+                weight yield infinity instead of NaN.
+        """
+        return GridInterpolator(grid=self, table=table, fill_value=fill_value)(states)
+
+
+@attr.s
+class GridInterpolator:
+    """ Multilinear interpolator of a grid table reusable across calls.
+
+        Note:
+            Periodic dimensions of the table are augmented once by their
+            first grid point (see augmentPeriodicData.m in helperOC), such
+            that all 2^d corners of a cell are constant flat offsets.
+            The table is copied only if augmented or not C contiguous.
+
+    """
+    ## Grid of the table
+    grid = attr.ib(type=Grid)
+
+    ## Table over grid (N_1, ..., N_d)
+    table = attr.ib(type=numpy.ndarray)
+
+    ## Value of states outside of non-periodic dimensions
+    fill_value = attr.ib(default=numpy.nan, type=float)
+
+    ## Shape of the table before augmentation
+    shape = attr.ib(default=None, type=typing.Optional[numpy.ndarray])
+
+    ## Cell corners (2^d x d) flagging the upper grid point along each axis
+    corners = attr.ib(default=None, type=typing.Optional[numpy.ndarray])
+
+    ## Flat offsets of the cell corners in the (augmented) table
+    corner_offsets = attr.ib(default=None, type=typing.Optional[numpy.ndarray])
+
+    ## Flat (C order) strides of the (augmented) table in elements
+    strides = attr.ib(default=None, type=typing.Optional[numpy.ndarray])
+
+    def __attrs_post_init__(self):
+        grid = self.grid
+        table = numpy.asarray(self.table)
+        self.shape = numpy.asarray(table.shape)
+        for axis in grid.periodic_axes:
+            table = numpy.concatenate(
+                    (table, numpy.take(table, [0], axis=axis)), axis=axis)
+        self.table = numpy.ascontiguousarray(table)
+
+        augmented_shape = numpy.asarray(self.table.shape)
+        self.strides = numpy.append(
+                numpy.cumprod(augmented_shape[:0:-1])[::-1], 1).astype(numpy.intp)
+        ## Axes of a single grid point have no upper corner
+        steps = numpy.where(augmented_shape > 1, self.strides, 0)
+        corners = (numpy.arange(2 ** len(steps))[:, numpy.newaxis]
+                   >> numpy.arange(len(steps))) & 1
+        self.corner_offsets = corners @ steps
+        self.corners = corners.astype(bool)
+
+    @property
+    def nbytes(self) -> int:
+        return self.table.nbytes
+
+    def __call__(self, states : numpy.ndarray) -> numpy.ndarray:
+        """ Return interpolated table values at states (N x d).
+
+            Note:
+                Infinite corners (e.g. unreachable min_ttr) with non-zero
+                weight yield infinity instead of NaN.
+        """
+        grid = self.grid
+        states = numpy.array(states, dtype=float, ndmin=2)
+        position = (states - grid.x_min) * grid.inv_dx
+
+        mask = numpy.ones(len(states), dtype=bool)
+        for axis in range(len(self.shape)):
+            n = self.shape[axis]
+            if grid.periodic[axis]:
+                position[:, axis] = numpy.mod(position[:, axis], n)
+            else:
+                mask &= (0 <= position[:, axis]) & (position[:, axis] <= n - 1)
+
+        ## Lower corner of cell (last cell for states on the upper bound)
+        position = position[mask]
+        upper_bound = numpy.where(grid.periodic, self.shape - 1, self.shape - 2)
+        lower = numpy.clip(numpy.floor(position), 0, numpy.maximum(upper_bound, 0))
+        fraction = position - lower
+        base = lower.astype(numpy.intp) @ self.strides
+
+        values = numpy.zeros(len(position))
+        weight = numpy.empty(len(position))
+        for corner, offset in zip(self.corners, self.corner_offsets):
+            weight.fill(1.0)
+            for axis, is_upper in enumerate(corner):
+                weight *= fraction[:, axis] if is_upper else 1.0 - fraction[:, axis]
+            corner_values = numpy.take(self.table, base + offset)
+            values += numpy.multiply(corner_values, weight,
+                                     out=numpy.zeros(len(position)), where=weight > 0)
+
+        result = numpy.full(len(states), self.fill_value, dtype=float)
+        result[mask] = values
+        return result
+
+
+@attr.s
+class LazyValueFunction:
+    """ Chunked view of the value function materialised on demand.
+
+        Note:
+            The HDF5 dataset is stored transposed (time first). The view
+            exposes the same (N_1, ..., N_d, T) ordering as the eagerly loaded
+            array but only reads points or time slices from the file until
+            the full array is accessed.
+
+    """
+    ## HDF5: /data/value_function dataset
+    dataset = attr.ib(type=h5py.Dataset)
+
+    ## Fully materialised value function (set on first full access)
+    data = attr.ib(default=None, type=typing.Optional[numpy.ndarray])
+
+    ## Most recently read time slice as (time_index, slice)
+    last_slice = attr.ib(default=None, type=typing.Optional[tuple])
+
+    @property
+    def shape(self) -> tuple:
+        return tuple(reversed(self.dataset.shape))
+
+    @property
+    def ndim(self) -> int:
+        return len(self.dataset.shape)
+
+    @property
+    def dtype(self) -> numpy.dtype:
+        return self.dataset.dtype
+
+    @property
+    def is_materialised(self) -> bool:
+        return self.data is not None
+
+    @property
+    def nbytes_loaded(self) -> int:
+        """ Return bytes of value function data currently held in memory. """
+        if self.data is not None:
+            return self.data.nbytes
+        if self.last_slice is not None:
+            return self.last_slice[1].nbytes
+        return 0
+
+    def at_time(self, time_index : int) -> numpy.ndarray:
+        """ Return value function slice at time index (reads only this slice). """
+        time_index = self._normalise_index(time_index, axis=-1)
+        if self.data is not None:
+            return self.data[..., time_index]
+        if self.last_slice is None or self.last_slice[0] != time_index:
+            self.last_slice = (time_index, self.dataset[time_index].transpose())
+        return self.last_slice[1]
+
+    def materialise(self) -> numpy.ndarray:
+        """ Return full value function and keep it in memory. """
+        if self.data is None:
+            self.data = self.dataset[...].transpose()
+            self.last_slice = None
+        return self.data
+
+    def _normalise_index(self, index, axis : int) -> int:
+        """ Return non-negative integer index along axis. """
+        index = int(index)
+        if index < 0:
+            index += self.shape[axis]
+        return index
+
+    def __getitem__(self, key):
+        key = key if isinstance(key, tuple) else (key,)
+        is_integer = [isinstance(k, (int, numpy.integer)) for k in key]
+
+        if self.data is None:
+            ## Point access
+            if len(key) == self.ndim and all(is_integer):
+                point = [self._normalise_index(k, axis=i) for i, k in enumerate(key)]
+                return self.dataset[tuple(reversed(point))]
+            ## Time slice access
+            if len(key) == 2 and key[0] is Ellipsis and is_integer[1]:
+                return self.at_time(key[1])
+
+        return self.materialise()[key]
+
+    def __array__(self, dtype=None, copy=None):
+        data = self.materialise()
+        return data if dtype is None else data.astype(dtype)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
 
 @attr.s
 class ReachableSetData:
@@ -299,44 +633,21 @@ class ReachableSetData:
         """ Ported from Mo Chens eval_u.m in helperOC git repo.
 
             Note:
-                Evaluates interpolated value from value function over grid.
+                Evaluates interpolated value from value function over grid
+                for a state (d) or states (N x d), see Grid.interpolate.
         """
-        g = self.grid
-        ## Handle periodicity in input x
-        for i in range(g.dim):
-            if self._is_periodic_dim(i):
-                period = max(g.vs[i]) - min(g.vs[i])
-
-                i_above_bounds = x > max(g.vs[i])
-                while i_above_bounds.any():
-                    x[i_above_bounds] = x[i_above_bounds] - period
-                    i_above_bounds = x > max(g.vs[i])
+        if interpolation_method != InterpolationMethod.Linear:
+            raise NotImplementedError(
+                    'Interpolation method: {}'.format(interpolation_method))
 
-                i_below_bounds = x < min(g.vs[i])
-                while i_below_bounds.any():
-                    x[i_below_bounds] = x[i_below_bounds] + period
-                    i_below_bounds = x < min(g.vs[i])
-
-        # Build points tuple for interpolation
-        points = []
-        for i in range(g.dim):
-            points.append(g.vs[i].reshape((g.vs[i].shape[0],)))
-        points = tuple(points)
-
-        ## TODO: Check if returning numpy value
-        return interpn(points, self.data, x, method=method)[0]
+        x = numpy.asarray(x, dtype=float)
+        values = self.grid.interpolate(numpy.asarray(self.value_function), x)
+        return values[0] if x.ndim == 1 else values
 
     def _get_states_from_indices(self, indices : typing.List[int]) \
             -> typing.List[numpy.ndarray]:
         """ Return list of states for list of indices. """
-        ## TODO: Return dask graph
-        states = list()
-        grid = self.grid
-        for index in indices:
-            grid_indices[index] = True
-            state = grid.state(index)
-            states.append(state)
-        return states
+        return list(self.grid.states_from_indices(indices))
 
     def sublevel_mask(self, level : float = 0.0,
             time_index : typing.Optional[int] = None) -> typing.List[tuple]:
@@ -28,3 +28,16 @@ class IndexHasNoValidNeighboursError(Exception):
     pass
 
 
+class TablesFormatError(Exception):
+    """ Exported lookup tables are incomplete or of unsupported version. """
+    pass
+
+
+class WrapperNotInitialisedError(Exception):
+    """ Read-only wrapper accessed data that is missing or being initialised. """
+    pass
+
+
+class ServiceError(Exception):
+    """ Query service failed to answer a request. """
+    pass
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+""" Initialisation engine for per-time-index reachable set data.
+
+    Computes sublevel masks, active states and their convex hull for each
+    discretised time index on a configurable pool of worker processes or
+    threads. Results are yielded in time order, such that a single writer
+    (the wrapper owning the HDF5 file) can store them.
+
+"""
+
+import attr
+import enum
+import time
+import hashlib
+import numpy
+import typing
+import collections
+import concurrent.futures
+
+import pylevel
+
+
+__license__ = "MIT"
+__status__ = "Development"
+
+
+class ExecutorType(enum.IntEnum):
+    """ Enumeration identifying the worker pool used for initialisation. """
+    Thread = 1
+    Process = 2
+
+
+@attr.s
+class StageTimings:
+    """ Accumulated wall time per initialisation stage. """
+    ## Seconds spent per stage
+    seconds = attr.ib(factory=collections.OrderedDict, type=typing.Dict[str, float])
+
+    def add(self, stage : str, seconds : float):
+        """ Accumulate seconds spent in stage. """
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    def update(self, timings : typing.Dict[str, float]):
+        """ Accumulate all stages of timings. """
+        for stage, seconds in timings.items():
+            self.add(stage, seconds)
+
+    def __str__(self):
+        return ', '.join('{}: {:.3f}s'.format(stage, seconds)
+                         for stage, seconds in self.seconds.items())
+
+
+@attr.s
+class TimeSliceResult:
+    """ Reachable set data computed for a single time index. """
+    ## Time index of the value function slice
+    time_index = attr.ib(type=int)
+    ## Boolean sublevel mask over the grid
+    subset = attr.ib(type=numpy.ndarray)
+    ## Vertices of the convexified 2D projections by projection name (empty for empty subsets)
+    vertices = attr.ib(factory=dict, type=typing.Dict[str, numpy.ndarray])
+    ## Content hash of the value function slice (see slice_digest)
+    digest = attr.ib(default=None, type=typing.Optional[str])
+    ## Seconds spent per stage in the worker
+    timings = attr.ib(factory=dict, type=typing.Dict[str, float])
+
+
+@attr.s
+class TimeSliceTask:
+    """ Picklable computation of reachable set data for a time index.
+
+        Note:
+            The grid is shipped to worker processes without its HDF5
+            handles, hence the task never touches the file.
+
+    """
+    ## Grid utility for index to state conversion
+    grid = attr.ib(type=pylevel.data.Grid)
+    ## Time stamps of time indices
+    time = attr.ib(type=numpy.ndarray)
+    ## Level of the (non-strict) sublevel set
+    level = attr.ib(default=0.0, type=float)
+    ## Projections of the convexified subsets
+    projections = attr.ib(factory=list, type=typing.List[pylevel.projection.Projection])
+    ## Hull only boundary cells of the subset (interior cells are never vertices)
+    boundary_only = attr.ib(default=True, type=bool)
+
+    def __call__(self, time_index : int, value_slice : numpy.ndarray) -> TimeSliceResult:
+        timings = dict()
+
+        ti = time.time()
+        digest = slice_digest(value_slice.transpose(), self.time[time_index])
+        timings['hash'] = time.time() - ti
+
+        ti = time.time()
+        subset = value_slice <= self.level
+        timings['mask'] = time.time() - ti
+        result = TimeSliceResult(time_index=time_index, subset=subset,
+                                 digest=digest, timings=timings)
+
+        ## Skip empty level sets
+        if not subset.any():
+            return result
+
+        ## Reduce active states to candidates of hull vertices
+        ti = time.time()
+        candidates = pylevel.projection.boundary_mask(subset) if self.boundary_only else subset
+        timings['boundary'] = time.time() - ti
+
+        ## Return indices of candidate states
+        ti = time.time()
+        indices = numpy.argwhere(candidates)
+        timings['indices'] = time.time() - ti
+
+        ti = time.time()
+        states = self.grid.states_from_indices(indices)
+        timings['states'] = time.time() - ti
+
+        ## Generate 2D projections of states
+        ti = time.time()
+        result.vertices = pylevel.projection.project_hulls(states, self.projections)
+        timings['hull'] = time.time() - ti
+
+        return result
+
+
+def slice_digest(value_slice : numpy.ndarray, time_stamp : float) -> str:
+    """ Return content hash of value function slice (as stored) and its time stamp. """
+    digest = hashlib.sha1(numpy.ascontiguousarray(value_slice))
+    digest.update(numpy.float64(time_stamp).tobytes())
+    return digest.hexdigest()
+
+
+def map_time_slices(task : TimeSliceTask,
+        value_function,
+        time_indices : typing.Iterable[int],
+        workers : int = 1,
+        executor_type : ExecutorType = ExecutorType.Process,
+        timings : typing.Optional[StageTimings] = None) \
+            -> typing.Iterator[TimeSliceResult]:
+    """ Yield results of task for each time index in order.
+
+        Note:
+            Slices are read from the transposed HDF5 value function
+            (T, N_d, ..., N_1) in the calling thread only. At most two
+            slices per worker are in flight to bound memory.
+
+    """
+    if timings is None:
+        timings = StageTimings()
+
+    def read(time_index):
+        ti = time.time()
+        value_slice = numpy.asarray(value_function[time_index]).transpose()
+        timings.add('read', time.time() - ti)
+        return value_slice
+
+    def collect(result):
+        timings.update(result.timings)
+        return result
+
+    if workers <= 1:
+        for time_index in time_indices:
+            yield collect(task(time_index, read(time_index)))
+        return
+
+    executor_class = concurrent.futures.ThreadPoolExecutor \
+            if executor_type == ExecutorType.Thread \
+            else concurrent.futures.ProcessPoolExecutor
+
+    with executor_class(max_workers=workers) as executor:
+        pending = collections.deque()
+        for time_index in time_indices:
+            pending.append(executor.submit(task, time_index, read(time_index)))
+            if len(pending) >= 2 * workers:
+                yield collect(pending.popleft().result())
+        while pending:
+            yield collect(pending.popleft().result())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+""" Projection module computing convexified 2D projections of reachable sets.
+
+    A projection maps states (N x d) linearly onto a plane, e.g. by
+    selecting an axis pair such as (x, y). The convex hulls of all
+    configured projections are computed from a single matrix product over
+    the active states of a time index and never require a GUI.
+
+"""
+
+import attr
+import numpy
+import typing
+from scipy.spatial import ConvexHull, QhullError
+
+
+__license__ = "MIT"
+__status__ = "Development"
+
+
+## Axis pair of the convexified subsets (x, y of the quad4D drone)
+DEFAULT_AXES = (0, 2)
+
+
+@attr.s
+class Projection:
+    """ Linear projection of states onto a plane identified by name. """
+    ## Key of the stored hulls (HDF5 group name)
+    name = attr.ib(type=str)
+
+    ## Projection matrix (2 x d)
+    matrix = attr.ib(converter=lambda matrix: numpy.array(matrix, dtype=float, ndmin=2),
+                     type=numpy.ndarray)
+
+    @classmethod
+    def from_axes(cls, axes : typing.Tuple[int, int], dim : int) -> 'Projection':
+        """ Return projection selecting an axis pair of d dimensional states. """
+        matrix = numpy.zeros((2, dim))
+        matrix[[0, 1], list(axes)] = 1.0
+        return cls(name='axes_{}_{}'.format(*axes), matrix=matrix)
+
+    @classmethod
+    def resolve(cls, projection, dim : int) -> 'Projection':
+        """ Return projection of axis pair or projection. """
+        if isinstance(projection, Projection):
+            return projection
+        return cls.from_axes(tuple(projection), dim)
+
+    def project(self, states : numpy.ndarray) -> numpy.ndarray:
+        """ Return projected states (N x 2). """
+        return numpy.asarray(states) @ self.matrix.T
+
+
+def boundary_mask(subset : numpy.ndarray) -> numpy.ndarray:
+    """ Return mask of active cells with an inactive or missing axis neighbour.
+
+        Note:
+            An active cell whose two neighbours along every axis are
+            active is their midpoint and thus never a hull vertex of any
+            linear projection. Cells on the grid boundary are kept, also
+            along periodic axes (states are not wrapped).
+    """
+    interior = subset.copy()
+    for axis in range(subset.ndim):
+        lower = [slice(None)] * subset.ndim
+        upper = [slice(None)] * subset.ndim
+        lower[axis] = slice(None, -1)
+        upper[axis] = slice(1, None)
+        interior[tuple(upper)] &= subset[tuple(lower)]
+        interior[tuple(lower)] &= subset[tuple(upper)]
+        lower[axis] = [0, -1]
+        interior[tuple(lower)] = False
+    return subset & ~interior
+
+
+def column_extremes(points : numpy.ndarray) -> numpy.ndarray:
+    """ Return distinct points (N x 2) with minimal or maximal y of their x.
+
+        Note:
+            Points strictly between the extremes of a column are convex
+            combinations of those and never hull vertices.
+    """
+    points = numpy.asarray(points, dtype=float).reshape(-1, 2)
+    if len(points) == 0:
+        return points
+    order = numpy.argsort(points[:, 0], kind='stable')
+    x = points[order, 0]
+    y = points[order, 1]
+    starts = numpy.flatnonzero(numpy.r_[True, x[1:] != x[:-1]])
+    columns = x[starts]
+    lower = numpy.minimum.reduceat(y, starts)
+    upper = numpy.maximum.reduceat(y, starts)
+    distinct = upper > lower
+    return numpy.vstack([
+        numpy.column_stack([columns, lower]),
+        numpy.column_stack([columns[distinct], upper[distinct]])])
+
+
+def convex_hull_vertices(points : numpy.ndarray) -> numpy.ndarray:
+    """ Return vertices of the convex hull of points (N x 2) in counterclockwise order.
+
+        Note:
+            Degenerate point sets (collinear or fewer than three distinct
+            points) are retried with joggled input and otherwise returned
+            as their distinct points.
+    """
+    points = column_extremes(points)
+    for options in (None, 'QJ'):
+        try:
+            hull = ConvexHull(points, qhull_options=options)
+            return points[hull.vertices]
+        except (QhullError, ValueError):
+            continue
+    return points
+
+
+def project_hulls(states : numpy.ndarray,
+        projections : typing.List[Projection]) -> typing.Dict[str, numpy.ndarray]:
+    """ Return hull vertices of states (N x d) for each projection by name. """
+    matrix = numpy.vstack([projection.matrix for projection in projections])
+    projected = numpy.asarray(states) @ matrix.T
+    return {projection.name: convex_hull_vertices(projected[:, 2 * i:2 * i + 2])
+            for i, projection in enumerate(projections)}
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+""" Query module serving thread-safe lookups from in-memory tables.
+
+    h5py serialises all calls on a global lock, hence lookups of a shared
+    wrapper do not scale across threads. The query facade copies the
+    lookup tables once from HDF5 and afterwards only indexes NumPy arrays,
+    which are never written. Only reachable sets are still read from HDF5
+    (once per time index) under a lock of the facade.
+
+"""
+
+import attr
+import numpy
+import typing
+import threading
+
+import pylevel
+
+
+__license__ = "MIT"
+__status__ = "Development"
+
+
+@attr.s
+class ReachableSetQuery:
+    """ Thread-safe query facade over an initialised wrapper.
+
+        Note:
+            Batched lookups spend their time in NumPy indexing, which
+            releases the GIL for large batches. Arguments are never
+            modified in place (unlike the periodic mapping of Grid.index).
+
+    """
+    ## Wrapper owning the HDF5 file (only accessed under lock)
+    wrapper = attr.ib(type='pylevel.wrapper.ReachableSetWrapper')
+
+    ## In-memory lookup tables (read-only after construction)
+    tables = attr.ib(default=None, type=typing.Optional[pylevel.tables.ReachableSetTables])
+
+    ## Copy gradient into memory (d + 1 times the size of min_ttr per time index)
+    load_gradient = attr.ib(default=True, type=bool)
+
+    ## Lock serialising HDF5 reads and subset cache updates
+    lock = attr.ib(factory=threading.Lock, type=typing.Any)
+
+    def __attrs_post_init__(self):
+        if self.tables is None:
+            with self.lock:
+                tables = pylevel.tables.ReachableSetTables.from_wrapper(self.wrapper)
+                tables.grad = self.wrapper.grad[...] if self.load_gradient else None
+            for name in ('time', 'min_ttr', 'earliest_time_index', 'grad'):
+                table = getattr(tables, name)
+                if table is not None:
+                    table = numpy.array(table)
+                    table.flags.writeable = False
+                    setattr(tables, name, table)
+            self.tables = tables
+
+    @property
+    def grid(self) -> pylevel.data.Grid:
+        return self.tables.grid
+
+    @property
+    def time(self) -> numpy.ndarray:
+        return self.tables.time
+
+    def _index(self, state : numpy.ndarray) -> tuple:
+        """ Return valid grid index of state without modifying it. """
+        return self.grid.index_valid(numpy.array(state, dtype=float).flatten())
+
+    def _time_index(self, t : float) -> int:
+        """ Return nearest time index (raises if beyond time horizon). """
+        if t > self.time[-1]:
+            raise pylevel.error.StateNotReachableError()
+        return int(numpy.abs(self.time - t).argmin())
+
+    def min_ttr(self, state : numpy.ndarray) -> float:
+        """ Return minimal time to reach of state (see ReachableSetWrapper.min_ttr). """
+        return self.tables.min_ttr[self._index(state)]
+
+    def min_ttr_batch(self, states : numpy.ndarray, return_mask : bool = False):
+        """ Return minimal time to reach for each row of states (N x d). """
+        return self.tables.min_ttr_batch(states, return_mask=return_mask)
+
+    def is_member(self, state : numpy.ndarray, return_time_to_reach=False) -> bool:
+        """ Return if state is member of any reachable set (raises if not). """
+        time_idx = self.tables.earliest_time_index[self._index(state)]
+        if time_idx < 0:
+            raise pylevel.error.StateNotReachableError()
+
+        if return_time_to_reach:
+            return True, self.time[time_idx]
+        return True
+
+    def is_member_batch(self, states : numpy.ndarray, return_time_to_reach : bool = False):
+        """ Return membership in any reachable set for each row of states (N x d). """
+        return self.tables.is_member_batch(states, return_time_to_reach=return_time_to_reach)
+
+    def gradient(self, state : numpy.ndarray, ttr : float, axis : int) -> float:
+        """ Return gradient of state along axis at nearest time index of ttr. """
+        if self.tables.grad is None:
+            raise pylevel.error.TablesFormatError('Query facade without gradient')
+        time_index = int(numpy.abs(self.time - ttr).argmin())
+        return self.tables.grad[(axis, ) + self._index(state) + (time_index, )]
+
+    def gradient_batch(self, states : numpy.ndarray, ttrs : numpy.ndarray, axis : int):
+        """ Return gradient along axis for each row of states (N x d) at times ttrs. """
+        return self.tables.gradient_batch(states, ttrs, axis)
+
+    def reach_at_t_idx(self, t_idx : int, convexified=False) -> numpy.ndarray:
+        """ Return reachable set at time index (read-only, shared between threads). """
+        with self.lock:
+            return self.wrapper.reach_at_t_idx(t_idx, convexified)
+
+    def reach_at_t(self, t : float, convexified=False) -> numpy.ndarray:
+        """ Return reachable set at time t (see ReachableSetWrapper.reach_at_t). """
+        return self.reach_at_t_idx(self._time_index(t), convexified)
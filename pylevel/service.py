@@ -0,0 +1,375 @@
+#!/usr/bin/env python
+""" Service module sharing one wrapper between processes over a Unix socket.
+
+    The server loads a single wrapper (or exported tables) and answers
+    min_ttr, is_member, gradient and reach_at_t requests of any number of
+    clients. Point lookup requests arriving within a short window are
+    concatenated into one vectorised lookup per request type.
+
+    Protocol (little-endian):
+        Request:  header (request_id u4, opcode u1, argument u1, dim u2, count u4),
+                  followed by count x dim states (f8) and count times (f8)
+                  for gradient requests, or a single time (f8) for reach_at_t.
+        Response: header (request_id u4, status u1, dtype u1, ndim u2, nbytes u4),
+                  followed by ndim extents (u4) and nbytes of array data
+                  (or an utf-8 error message if status is not Ok).
+
+    Usage:
+        python -m pylevel.service --path level_set.mat --socket /tmp/pylevel.sock
+
+"""
+
+import os
+import sys
+import attr
+import enum
+import numpy
+import socket
+import struct
+import typing
+import asyncio
+import argparse
+import threading
+import collections
+
+import pylevel
+
+
+__license__ = "MIT"
+__status__ = "Development"
+
+
+class Opcode(enum.IntEnum):
+    """ Enumeration identifying request types. """
+    MinTTR = 1
+    IsMember = 2
+    Gradient = 3
+    ReachAtT = 4
+
+
+class Status(enum.IntEnum):
+    """ Enumeration identifying response states. """
+    Ok = 0
+    StateNotReachable = 1
+    Error = 2
+
+
+## Request header: request_id, opcode, argument (axis or convexified), dim, count
+REQUEST_HEADER = struct.Struct('<IBBHI')
+## Response header: request_id, status, dtype code, ndim, nbytes
+RESPONSE_HEADER = struct.Struct('<IBBHI')
+## Array dtypes of responses by code
+DTYPES = (numpy.dtype('?'), numpy.dtype('<f8'), numpy.dtype('<f4'), numpy.dtype('<i2'))
+
+## Default socket path
+SOCKET_PATH = '/tmp/pylevel.sock'
+## Seconds to collect point lookups of several clients into one batch
+BATCH_WINDOW = 5e-4
+## Maximum states of a single batched lookup
+MAX_BATCH_SIZE = 2**16
+
+
+def encode_array(request_id : int, array : numpy.ndarray) -> bytes:
+    """ Return response frame of array. """
+    array = numpy.ascontiguousarray(array)
+    code = DTYPES.index(array.dtype.newbyteorder('<'))
+    data = array.astype(DTYPES[code], copy=False).tobytes()
+    return RESPONSE_HEADER.pack(request_id, Status.Ok, code, array.ndim, len(data)) \
+        + struct.pack('<{}I'.format(array.ndim), *array.shape) + data
+
+
+def encode_error(request_id : int, status : Status, message : str) -> bytes:
+    """ Return response frame of error. """
+    data = message.encode('utf-8')
+    return RESPONSE_HEADER.pack(request_id, status, 0, 0, len(data)) + data
+
+
+@attr.s
+class LookupRequest:
+    """ Pending point lookup of a client awaiting its batch. """
+    opcode = attr.ib(type=Opcode)
+    argument = attr.ib(type=int)
+    states = attr.ib(type=numpy.ndarray)
+    times = attr.ib(default=None, type=typing.Optional[numpy.ndarray])
+    future = attr.ib(default=None, type=typing.Optional[asyncio.Future])
+
+
+@attr.s
+class ReachableSetServer:
+    """ Asyncio server answering requests from a query facade (or tables).
+
+        Note:
+            Lookups are computed in the event loop thread, the batching
+            amortises the per-call overhead over all waiting clients.
+            reach_at_t requires a query facade with a wrapper.
+
+    """
+    ## Query facade (ReachableSetQuery) or ReachableSetTables
+    query = attr.ib()
+
+    ## Unix socket path
+    socket_path = attr.ib(default=SOCKET_PATH, type=str)
+
+    ## Seconds to collect lookups into one batch
+    batch_window = attr.ib(default=BATCH_WINDOW, type=float)
+
+    ## Maximum states of a single batched lookup
+    max_batch_size = attr.ib(default=MAX_BATCH_SIZE, type=int)
+
+    ## Pending lookups (created in serve)
+    queue = attr.ib(default=None, type=typing.Optional[asyncio.Queue])
+
+    ## Served lookups and batches
+    lookups = attr.ib(default=0, type=int)
+    batches = attr.ib(default=0, type=int)
+
+    async def serve(self, ready : typing.Optional[threading.Event] = None):
+        """ Serve requests until cancelled. """
+        self.queue = asyncio.Queue()
+        ## Remove socket of a previous server
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        batcher = asyncio.ensure_future(self._batch_lookups())
+        server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path)
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+    async def _handle_client(self, reader, writer):
+        """ Read requests of a client and write responses in request order.
+
+            Note:
+                Requests of unknown opcodes are answered with an error and
+                close the connection (their payload size is unknown).
+        """
+        try:
+            while True:
+                header = await reader.readexactly(REQUEST_HEADER.size)
+                request_id, opcode, argument, dim, count = REQUEST_HEADER.unpack(header)
+                try:
+                    opcode = Opcode(opcode)
+                except ValueError:
+                    writer.write(encode_error(
+                        request_id, Status.Error, 'Unknown opcode: {}'.format(opcode)))
+                    await writer.drain()
+                    break
+
+                if opcode == Opcode.ReachAtT:
+                    t, = struct.unpack('<d', await reader.readexactly(8))
+                    writer.write(self._reach_at_t(request_id, t, bool(argument)))
+                    await writer.drain()
+                    continue
+
+                states = numpy.frombuffer(
+                        await reader.readexactly(8 * dim * count), dtype='<f8').reshape(count, dim)
+                times = None
+                if opcode == Opcode.Gradient:
+                    times = numpy.frombuffer(await reader.readexactly(8 * count), dtype='<f8')
+
+                ## Reject states of other dimension before they join a batch
+                if dim != len(self.query.grid.dx):
+                    writer.write(encode_error(request_id, Status.Error,
+                        'States of dimension {} instead of {}'.format(
+                            dim, len(self.query.grid.dx))))
+                    await writer.drain()
+                    continue
+
+                request = LookupRequest(
+                        opcode=opcode, argument=argument, states=states, times=times,
+                        future=asyncio.get_running_loop().create_future())
+                await self.queue.put(request)
+                writer.write(await self._respond(request_id, request.future))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, request_id : int, future : asyncio.Future) -> bytes:
+        """ Return response frame of lookup result. """
+        try:
+            return encode_array(request_id, await future)
+        except Exception as e:
+            return encode_error(request_id, Status.Error, repr(e))
+
+    def _reach_at_t(self, request_id : int, t : float, convexified : bool) -> bytes:
+        """ Return response frame of reachable set at time t. """
+        try:
+            return encode_array(request_id, self.query.reach_at_t(t, convexified))
+        except pylevel.error.StateNotReachableError as e:
+            return encode_error(request_id, Status.StateNotReachable, repr(e))
+        except Exception as e:
+            return encode_error(request_id, Status.Error, repr(e))
+
+    async def _batch_lookups(self):
+        """ Collect pending lookups within the batch window and answer them per type. """
+        while True:
+            requests = [await self.queue.get()]
+            size = len(requests[0].states)
+            await asyncio.sleep(self.batch_window)
+            while not self.queue.empty() and size < self.max_batch_size:
+                requests.append(self.queue.get_nowait())
+                size += len(requests[-1].states)
+
+            ## A failing batch must not stop answering further lookups
+            try:
+                groups = collections.defaultdict(list)
+                for request in requests:
+                    groups[(request.opcode, request.argument, request.states.shape[1])].append(request)
+                for (opcode, argument, _), group in groups.items():
+                    self._lookup(opcode, argument, group)
+                self.batches += 1
+            except Exception as e:
+                for request in requests:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def _lookup(self, opcode : Opcode, argument : int, requests : typing.List[LookupRequest]):
+        """ Answer requests of one type with a single vectorised lookup. """
+        try:
+            states = numpy.concatenate([request.states for request in requests])
+            if opcode == Opcode.MinTTR:
+                result = self.query.min_ttr_batch(states)
+            elif opcode == Opcode.IsMember:
+                _, result = self.query.is_member_batch(states, return_time_to_reach=True)
+            else:
+                times = numpy.concatenate([request.times for request in requests])
+                result = self.query.gradient_batch(states, times, argument)
+        except Exception as e:
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+
+        self.lookups += len(states)
+        offsets = numpy.cumsum([len(request.states) for request in requests])[:-1]
+        for request, part in zip(requests, numpy.split(result, offsets)):
+            if not request.future.done():
+                request.future.set_result(part)
+
+
+@attr.s
+class ReachableSetClient:
+    """ Blocking client of a ReachableSetServer (thread-safe).
+
+        Note:
+            States outside of the grid return NaN (min_ttr, gradient) or
+            are not members, as the batch methods of the wrapper.
+
+    """
+    ## Unix socket path of the server
+    socket_path = attr.ib(default=SOCKET_PATH, type=str)
+
+    ## Connected socket (connected on initialisation)
+    connection = attr.ib(default=None, type=typing.Optional[socket.socket])
+
+    ## Lock serialising requests of threads sharing the client
+    lock = attr.ib(factory=threading.Lock, type=typing.Any)
+
+    ## Identifier of the next request
+    request_id = attr.ib(default=0, type=int)
+
+    def __attrs_post_init__(self):
+        self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.connection.connect(self.socket_path)
+
+    def close(self):
+        self.connection.close()
+
+    def _receive(self, size : int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.connection.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError('Connection closed by server')
+            data.extend(chunk)
+        return bytes(data)
+
+    def _request(self, opcode : Opcode, argument : int, count : int, dim : int,
+            payload : bytes) -> numpy.ndarray:
+        """ Send request and return array of response. """
+        with self.lock:
+            self.request_id = (self.request_id + 1) % 2**32
+            self.connection.sendall(REQUEST_HEADER.pack(
+                self.request_id, opcode, argument, dim, count) + payload)
+
+            header = self._receive(RESPONSE_HEADER.size)
+            request_id, status, code, ndim, nbytes = RESPONSE_HEADER.unpack(header)
+            shape = struct.unpack('<{}I'.format(ndim), self._receive(4 * ndim)) \
+                    if status == Status.Ok else ()
+            data = self._receive(nbytes)
+
+        if status == Status.StateNotReachable:
+            raise pylevel.error.StateNotReachableError(data.decode('utf-8'))
+        if status != Status.Ok:
+            raise pylevel.error.ServiceError(data.decode('utf-8'))
+        return numpy.frombuffer(data, dtype=DTYPES[code]).reshape(shape)
+
+    def _states(self, states : numpy.ndarray) -> numpy.ndarray:
+        return numpy.ascontiguousarray(numpy.array(states, dtype='<f8', ndmin=2))
+
+    def min_ttr_batch(self, states : numpy.ndarray) -> numpy.ndarray:
+        """ Return minimal time to reach for each row of states (N x d). """
+        states = self._states(states)
+        return self._request(Opcode.MinTTR, 0, *states.shape, states.tobytes())
+
+    def is_member_batch(self, states : numpy.ndarray, return_time_to_reach : bool = False):
+        """ Return membership in any reachable set for each row of states (N x d). """
+        states = self._states(states)
+        time_to_reach = self._request(Opcode.IsMember, 0, *states.shape, states.tobytes())
+        is_member = ~numpy.isnan(time_to_reach)
+
+        if return_time_to_reach:
+            return is_member, time_to_reach
+        return is_member
+
+    def gradient_batch(self, states : numpy.ndarray, ttrs : numpy.ndarray,
+            axis : int) -> numpy.ndarray:
+        """ Return gradient along axis for each row of states (N x d) at times ttrs. """
+        states = self._states(states)
+        ttrs = numpy.broadcast_to(numpy.asarray(ttrs, dtype='<f8'), (len(states), ))
+        return self._request(Opcode.Gradient, axis, *states.shape,
+                             states.tobytes() + numpy.ascontiguousarray(ttrs).tobytes())
+
+    def reach_at_t(self, t : float, convexified=False) -> numpy.ndarray:
+        """ Return reachable set at time t. """
+        return self._request(Opcode.ReachAtT, int(convexified), 0, 0, struct.pack('<d', t))
+
+
+def main(argv : typing.Optional[typing.List[str]] = None):
+    """ Load wrapper (or exported tables) and serve requests on Unix socket. """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0].strip())
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--path', help='Initialised *.mat file (opened read-only)')
+    source.add_argument('--tables', help='Directory of exported tables (no reach_at_t)')
+    parser.add_argument('--socket', default=SOCKET_PATH, help='Unix socket path')
+    parser.add_argument('--batch-window', type=float, default=BATCH_WINDOW,
+                        help='Seconds to collect lookups into one batch')
+    arguments = parser.parse_args(argv)
+
+    if arguments.path is not None:
+        query = pylevel.wrapper.ReachableSetWrapper(
+                label='ReachableSetService',
+                path=arguments.path,
+                read_only=True,
+                show_config=False).query()
+    else:
+        query = pylevel.tables.ReachableSetTables.load(arguments.tables)
+
+    server = ReachableSetServer(
+            query=query,
+            socket_path=arguments.socket,
+            batch_window=arguments.batch_window)
+    print('Serving on: ', arguments.socket)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+""" Storage module encoding wrapper datasets in HDF5.
+
+    Subsets are boolean masks over the grid. Besides the dense gzip layout
+    they can be stored bit-packed or as sparse flat coordinates of member
+    cells, which are smaller on disk and faster to decode. The format is
+    stored with each dataset, such that readers decode any of them to the
+    same boolean array.
+
+"""
+
+import enum
+import h5py
+import numpy
+import typing
+
+
+__license__ = "MIT"
+__status__ = "Development"
+
+
+class SubsetFormat(enum.IntEnum):
+    """ Enumeration identifying on-disk formats of subsets. """
+    ## One byte per cell (gzip)
+    Dense = 1
+    ## One bit per cell using numpy.packbits (lzf)
+    Packed = 2
+    ## Sorted flat indices of member cells (shuffle + gzip)
+    Sparse = 3
+
+
+## Grid axes spanned by each chunk of dense subsets (cross-sections in x and y)
+SUBSET_PLANE_AXES = (0, 1)
+
+
+def plane_chunks(shape : tuple, plane_axes : typing.Tuple[int, ...] = SUBSET_PLANE_AXES) -> tuple:
+    """ Return chunk shape spanning plane axes and a single cell along other axes. """
+    return tuple(n if axis in plane_axes else 1 for axis, n in enumerate(shape))
+
+
+def write_subset(group : h5py.Group,
+        name : str,
+        subset : numpy.ndarray,
+        subset_format : SubsetFormat = SubsetFormat.Dense,
+        plane_axes : typing.Tuple[int, ...] = SUBSET_PLANE_AXES) -> h5py.Dataset:
+    """ Store boolean subset in group using subset format.
+
+        Note:
+            Dense subsets are chunked per cross-section along plane_axes,
+            such that reading a slice only decodes the chunks it spans.
+    """
+    subset_format = SubsetFormat(subset_format)
+    if subset_format == SubsetFormat.Packed:
+        dataset = group.create_dataset(
+                name,
+                data=numpy.packbits(subset, axis=None),
+                compression='lzf')
+    elif subset_format == SubsetFormat.Sparse:
+        dtype = 'i4' if subset.size < 2**31 else 'i8'
+        dataset = group.create_dataset(
+                name,
+                data=numpy.flatnonzero(subset).astype(dtype),
+                shuffle=True,
+                compression='gzip')
+    else:
+        dataset = group.create_dataset(
+                name,
+                data=subset,
+                dtype='?',
+                chunks=plane_chunks(subset.shape, plane_axes),
+                compression='gzip')
+
+    dataset.attrs['format'] = int(subset_format)
+    dataset.attrs['shape'] = subset.shape
+    return dataset
+
+
+def encoding_of(dataset : h5py.Dataset) -> typing.Tuple[SubsetFormat, tuple]:
+    """ Return format and grid shape of stored subset.
+
+        Note:
+            Subsets stored without format attribute are dense.
+    """
+    subset_format = SubsetFormat(dataset.attrs.get('format', SubsetFormat.Dense))
+    if subset_format == SubsetFormat.Dense:
+        return subset_format, dataset.shape
+    return subset_format, tuple(dataset.attrs['shape'])
+
+
+def read_encoded(dataset : h5py.Dataset) \
+        -> typing.Tuple[numpy.ndarray, SubsetFormat, tuple]:
+    """ Return stored subset without decoding, its format and grid shape. """
+    return (dataset[...], ) + encoding_of(dataset)
+
+
+def decode(encoded : numpy.ndarray,
+        subset_format : SubsetFormat,
+        shape : tuple) -> numpy.ndarray:
+    """ Return boolean subset of encoded subset. """
+    if subset_format == SubsetFormat.Packed:
+        size = int(numpy.prod(shape))
+        return numpy.unpackbits(encoded, count=size).astype(bool).reshape(shape)
+    if subset_format == SubsetFormat.Sparse:
+        subset = numpy.zeros(int(numpy.prod(shape)), dtype=bool)
+        subset[encoded] = True
+        return subset.reshape(shape)
+    return encoded
+
+
+def read_subset(dataset : h5py.Dataset) -> numpy.ndarray:
+    """ Return boolean subset of dataset in any subset format. """
+    return decode(*read_encoded(dataset))
+
+
+def read_subset_slice(dataset : h5py.Dataset,
+        selection : tuple,
+        encoded : typing.Optional[numpy.ndarray] = None) -> numpy.ndarray:
+    """ Return boolean hyperslab of stored subset selected by integers and slices per axis.
+
+        Note:
+            Dense subsets only read the chunks spanned by the hyperslab.
+            Other formats test membership of its cells on the encoded
+            subset (read unless passed), without decoding the whole set.
+    """
+    subset_format, shape = encoding_of(dataset)
+    if subset_format == SubsetFormat.Dense:
+        return dataset[selection]
+
+    if encoded is None:
+        encoded = dataset[...]
+    axes = [numpy.atleast_1d(numpy.arange(n)[s]) for n, s in zip(shape, selection)]
+    indices = numpy.stack(numpy.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, len(shape))
+    sliced_shape = tuple(len(a) for a, s in zip(axes, selection) if isinstance(s, slice))
+    return contains(encoded, subset_format, shape, indices).reshape(sliced_shape)
+
+
+def contains(encoded : numpy.ndarray,
+        subset_format : SubsetFormat,
+        shape : tuple,
+        indices : numpy.ndarray) -> numpy.ndarray:
+    """ Return membership of grid indices (N x d) without decoding the subset. """
+    indices = numpy.asarray(indices)
+    if subset_format == SubsetFormat.Dense:
+        return encoded[tuple(indices.T)]
+
+    flat = numpy.ravel_multi_index(tuple(indices.T), shape)
+    if subset_format == SubsetFormat.Packed:
+        ## Most significant bit first (numpy.packbits default)
+        return ((encoded[flat >> 3] >> (7 - (flat & 7))) & 1).astype(bool)
+
+    if len(encoded) == 0:
+        return numpy.zeros(flat.shape, dtype=bool)
+    position = numpy.minimum(numpy.searchsorted(encoded, flat), len(encoded) - 1)
+    return encoded[position] == flat
+
+
+class StorageLayout(enum.IntEnum):
+    """ Enumeration identifying chunk layouts of lookup tables (min_ttr, grad). """
+    ## Chunk shapes of h5py automatic chunking (per axis and time slice for grad)
+    Default = 1
+    ## Small chunks such that point lookups only decode a few kilobytes
+    PointQuery = 2
+    ## Large chunks spanning whole grid slices for slice reads
+    SliceRead = 3
+
+
+class Compression(enum.IntEnum):
+    """ Enumeration identifying HDF5 filters of lookup tables. """
+    Uncompressed = 0
+    LZF = 1
+    Gzip = 2
+    ShuffleGzip = 3
+
+
+## Target chunk size for point queries (fits the default 1 MiB chunk cache many times)
+POINT_QUERY_CHUNK_BYTES = 2**12
+## Upper bound of chunks for slice reads (HDF5 limits chunks to 4 GiB)
+SLICE_READ_CHUNK_BYTES = 2**26
+## Bounds of automatic chunks in bytes (as h5py: base, minimum, maximum)
+AUTO_CHUNK_BYTES = (2**14, 2**13, 2**20)
+
+
+def _grid_chunks(grid_shape : tuple, itemsize : int, chunk_bytes : int) -> tuple:
+    """ Return chunk shape of grid axes with about chunk_bytes and equal side length. """
+    side = max(1, int((chunk_bytes / itemsize) ** (1.0 / len(grid_shape))))
+    return tuple(min(side, n) for n in grid_shape)
+
+
+def _auto_chunks(shape : tuple, itemsize : int) -> tuple:
+    """ Return chunk shape of h5py automatic chunking (chunks=True).
+
+        Note:
+            Reimplements the heuristic of h5py (guess_chunk, not public):
+            axes are halved in turns until the chunk approaches a target
+            size, which grows with the dataset size within the bounds.
+    """
+    base, minimum, maximum = AUTO_CHUNK_BYTES
+    chunks = numpy.array(shape, dtype=float)
+    target = base * 2**numpy.log10(numpy.prod(chunks) * itemsize / 2**20)
+    target = min(max(target, minimum), maximum)
+
+    axis = 0
+    while True:
+        chunk_bytes = numpy.prod(chunks) * itemsize
+        if (chunk_bytes < target or abs(chunk_bytes - target) / target < 0.5) \
+                and chunk_bytes < maximum:
+            break
+        if numpy.prod(chunks) == 1:
+            break
+        chunks[axis % len(shape)] = numpy.ceil(chunks[axis % len(shape)] / 2.0)
+        axis += 1
+    return tuple(int(n) for n in chunks)
+
+
+def dataset_options(layout : StorageLayout,
+        compression : Compression,
+        shape : tuple,
+        itemsize : int,
+        is_gradient : bool = False) -> dict:
+    """ Return keyword arguments to create a lookup table dataset.
+
+        Note:
+            Gradients have shape (axes, N_1, ..., N_d, T) and are chunked per
+            axis and time slice, such that appending time slices keeps the
+            chunk shape. Tables otherwise span the grid (N_1, ..., N_d).
+            Chunks never depend on the blocks gradients are written in.
+    """
+    grid_shape = shape[1:-1] if is_gradient else shape
+
+    if layout == StorageLayout.Default:
+        grid_chunks = _auto_chunks(grid_shape, itemsize)
+    elif layout == StorageLayout.PointQuery:
+        grid_chunks = _grid_chunks(grid_shape, itemsize, POINT_QUERY_CHUNK_BYTES)
+    elif layout == StorageLayout.SliceRead:
+        ## Split leading axis of slices above the HDF5 chunk limit
+        grid_chunks = list(grid_shape)
+        while grid_chunks[0] > 1 \
+                and numpy.prod(grid_chunks) * itemsize > SLICE_READ_CHUNK_BYTES:
+            grid_chunks[0] = (grid_chunks[0] + 1) // 2
+        grid_chunks = tuple(grid_chunks)
+
+    if is_gradient:
+        chunks = (1, ) + grid_chunks + (1, )
+    else:
+        chunks = grid_chunks
+    return _with_filters(dict(chunks=chunks), compression)
+
+
+def _with_filters(options : dict, compression : Compression) -> dict:
+    """ Return dataset options extended by HDF5 filters of compression. """
+    if compression == Compression.LZF:
+        options['compression'] = 'lzf'
+    elif compression in (Compression.Gzip, Compression.ShuffleGzip):
+        options['compression'] = 'gzip'
+        options['shuffle'] = compression == Compression.ShuffleGzip
+    return options
+
+
+def matches_options(dataset : h5py.Dataset, options : dict) -> bool:
+    """ Return if existing dataset was created with chunks and filters of options. """
+    return dataset.chunks == options['chunks'] \
+        and dataset.compression == options.get('compression') \
+        and dataset.shuffle == options.get('shuffle', False)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+""" Tables module serving precomputed lookup tables without HDF5.
+
+    The initialised lookup tables of a wrapper (min_ttr, earliest time
+    index, gradient and time) are exported as plain `.npy` files next to
+    a JSON grid specification. Loading maps the files read-only using
+    numpy.memmap, such that any number of processes share a single page
+    cache copy and lookups are plain array indexing.
+
+"""
+
+import os
+import attr
+import json
+import numpy
+import typing
+
+import pylevel
+
+
+__license__ = "MIT"
+__status__ = "Development"
+
+
+## Version of the exported directory layout
+TABLES_FORMAT_VERSION = 1
+## File name of the grid specification
+GRID_FILENAME = 'grid.json'
+## Exported tables (file name without .npy suffix)
+TABLE_NAMES = ('time', 'min_ttr', 'earliest_time_index', 'grad')
+
+
+@attr.s
+class ReachableSetTables:
+    """ Precomputed lookup tables of an initialised reachable set.
+
+        Note:
+            Arrays are either in memory, memory-mapped (see load) or HDF5
+            datasets of a wrapper (see from_wrapper). The gradient has shape
+            (d + 1, N_1, ..., N_d, T) and is optional.
+
+    """
+    ## Numerical grid interface (without HDF5 handles)
+    grid = attr.ib(type=pylevel.data.Grid)
+
+    ## Time stamps of time indices
+    time = attr.ib(type=numpy.ndarray)
+
+    ## Minimal time to reach of each grid cell (N_1, ..., N_d)
+    min_ttr = attr.ib(type=numpy.ndarray)
+
+    ## Earliest time index of membership of each grid cell (-1 if never)
+    earliest_time_index = attr.ib(type=numpy.ndarray)
+
+    ## Gradient of value function (d + 1, N_1, ..., N_d, T)
+    grad = attr.ib(default=None)
+
+    @classmethod
+    def from_wrapper(cls, wrapper : 'pylevel.wrapper.ReachableSetWrapper') \
+            -> 'ReachableSetTables':
+        """ Return tables of initialised wrapper (gradient stays in HDF5). """
+        return cls(
+                grid=wrapper.grid,
+                time=numpy.asarray(wrapper.time),
+                min_ttr=wrapper._ttr_table(),
+                earliest_time_index=wrapper._earliest_time_index(),
+                grad=wrapper.grad)
+
+    def export(self, directory : str) -> str:
+        """ Write tables as .npy files and grid specification to directory.
+
+            Note:
+                The gradient is streamed one time slice at a time, hence
+                HDF5 datasets larger than memory are exported as well.
+        """
+        os.makedirs(directory, exist_ok=True)
+
+        for name in TABLE_NAMES[:-1]:
+            numpy.save(os.path.join(directory, name + '.npy'),
+                       numpy.ascontiguousarray(getattr(self, name)))
+
+        if self.grad is not None:
+            grad = numpy.lib.format.open_memmap(
+                    os.path.join(directory, 'grad.npy'),
+                    mode='w+',
+                    dtype=self.grad.dtype,
+                    shape=self.grad.shape)
+            for time_index in range(self.grad.shape[-1]):
+                grad[..., time_index] = self.grad[..., time_index]
+            grad.flush()
+            del grad
+
+        metadata = dict(version=TABLES_FORMAT_VERSION, grid=self.grid.metadata())
+        with open(os.path.join(directory, GRID_FILENAME), 'w') as file_handle:
+            json.dump(metadata, file_handle, indent=4)
+        return directory
+
+    @classmethod
+    def load(cls, directory : str, mmap_mode : typing.Optional[str] = 'r') \
+            -> 'ReachableSetTables':
+        """ Return tables of exported directory (memory-mapped by default). """
+        with open(os.path.join(directory, GRID_FILENAME)) as file_handle:
+            metadata = json.load(file_handle)
+
+        if metadata.get('version') != TABLES_FORMAT_VERSION:
+            raise pylevel.error.TablesFormatError(
+                    'Unsupported tables version: {}'.format(metadata.get('version')))
+
+        tables = dict()
+        for name in TABLE_NAMES:
+            path = os.path.join(directory, name + '.npy')
+            if os.path.exists(path):
+                tables[name] = numpy.load(path, mmap_mode=mmap_mode)
+
+        return cls(
+                grid=pylevel.data.Grid.from_metadata(metadata['grid'], show_config=False),
+                **tables)
+
+    def min_ttr_batch(self,
+            states : numpy.ndarray,
+            return_mask : bool = False):
+        """ Return minimal time to reach for each row of states (N x d).
+
+            Note:
+                Rows outside of the grid are returned as NaN.
+        """
+        flat, mask = self.grid.flat_index_batch(states)
+        ttr = numpy.full(mask.shape, numpy.nan)
+        ttr[mask] = numpy.take(self.min_ttr, flat[mask])
+
+        if return_mask:
+            return ttr, mask
+        return ttr
+
+    def is_member_batch(self,
+            states : numpy.ndarray,
+            return_time_to_reach : bool = False):
+        """ Return membership in any reachable set for each row of states (N x d). """
+        flat, mask = self.grid.flat_index_batch(states)
+        time_idx = numpy.full(mask.shape, -1, dtype=numpy.int16)
+        time_idx[mask] = numpy.take(self.earliest_time_index, flat[mask])
+        is_member = time_idx >= 0
+
+        if return_time_to_reach:
+            time_to_reach = numpy.full(mask.shape, numpy.nan)
+            time_to_reach[is_member] = self.time[time_idx[is_member]]
+            return is_member, time_to_reach
+        return is_member
+
+    def gradient_batch(self,
+            states : numpy.ndarray,
+            ttrs : numpy.ndarray,
+            axis : int) -> numpy.ndarray:
+        """ Return gradient along axis for each row of states (N x d) at times ttrs.
+
+            Note:
+                Rows outside of the grid are returned as NaN. Requires loaded
+                tables (see load), HDF5 datasets do not support point lists.
+        """
+        if self.grad is None:
+            raise pylevel.error.TablesFormatError('Tables exported without gradient')
+
+        indices, mask = self.grid.index_batch(states)
+        ttrs = numpy.broadcast_to(numpy.asarray(ttrs, dtype=float), mask.shape)
+        time_indices = numpy.abs(self.time[numpy.newaxis, :] - ttrs[:, numpy.newaxis]).argmin(axis=1)
+
+        grad = numpy.full(mask.shape, numpy.nan)
+        grad[mask] = self.grad[(axis, ) + tuple(indices[mask].T) + (time_indices[mask], )]
+        return grad
@@ -70,56 +70,31 @@ def show_plots():
     plt.show()
 
 
+def points_in_hull(points, hull):
+    """Return if points (N x d) are strictly inside all half-spaces of hull
+
+    Note:
+        Evaluates all hull equations for all points in one matrix product.
+    """
+    points = numpy.asarray(points, dtype=float)
+    normals = hull.equations[:, :-1]
+    offsets = hull.equations[:, -1]
+    return (points @ normals.T < -offsets).all(axis=-1)
+
+
 def in_hull(idx, hull):
     """Check if in all half-spaces"""
-    eqs = hull.equations
-    inside_eqs = []
-    for eq in eqs:
-        total = 0
-        for i, ind in enumerate(idx):
-            coeff = eq[i]
-            total += coeff * ind
-        inside_eqs.append(total < -eq[-1])
-    return numpy.all(numpy.array(inside_eqs))
-
+    return bool(points_in_hull(numpy.asarray(idx, dtype=float)[numpy.newaxis], hull)[0])
 
 
 def hull_img(hull, w, h):
-    """Compute image of hull"""
-    grid_explicit = numpy.empty((w, h),
-                                dtype = object)
-    grid_explicit[:, :] = [[(i, j) for i in range(w)]
-                            for j in range(h)]
-    in_hull_f = lambda x: float(in_hull(x, hull))
-    in_hull_vectorized = numpy.vectorize(in_hull_f)
-    grid_explicit = grid_explicit.flatten()
-    hull_in_grid_img = in_hull_vectorized(grid_explicit)
-    hull_in_grid_img = hull_in_grid_img.reshape((w, h))
-
-    return hull_in_grid_img
-
-# LEGACY
-def build_state_to_reachset_dict(BRS_list, in_reach_set_idx):
-    # TODO: too slow
-    state_to_reachset_dict = {}
-    n_x = BRS_list[0].N[0]
-    n_y = BRS_list[0].N[1]
-    n_vx = BRS_list[0].N[2]
-    n_vy = BRS_list[0].N[3]
-    for x_ind in range(n_x):
-        for y_ind in range(n_y):
-            for vx_ind in range(n_vx):
-                for vy_ind in range(n_vy):
-                    ind = (x_ind, y_ind, vx_ind, vy_ind)
-                    not_in_brs = True
-                    for i in range(len(BRS_list)):
-                        if ind in in_reach_set_idx[i]:
-                            reach_set_pts =  np.array(in_reach_set_idx[i])
-                            xy_pts = reach_set_pts[:, 0:2]
-                            state_to_reachset_dict[ind] = xy_pts
-                            not_in_brs = False
-                            break
-                    if not_in_brs:
-                        state_to_reachset_dict[ind] = np.array([])
-    return state_to_reachset_dict
+    """Compute image of hull
+
+    Note:
+        Pixel (row, column) is evaluated at coordinate (column, row).
+    """
+    rows, columns = numpy.mgrid[0:w, 0:h]
+    pixels = numpy.stack([columns.ravel(), rows.ravel()], axis=1)
+    hull_in_grid_img = points_in_hull(pixels, hull).astype(float)
 
+    return hull_in_grid_img.reshape((w, h))
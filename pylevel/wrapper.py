@@ -2,18 +2,17 @@
 """ Level set wrapper providing convenience methods. """
 
 
-import sys
+import os
 import attr
 import dask
 import enum
 import time
 import h5py
+import shutil
 import numpy
-import pickle
 import typing
 import dask.array
 import dask.dataframe
-from scipy.spatial import ConvexHull
 
 
 import pylevel
@@ -94,14 +93,35 @@ class ReachableSetWrapper:
 
     ttr = attr.ib(default=None, type=typing.Optional[h5py.Group])
 
+    ## In-memory copy of the min_ttr dataset for batched lookups (loaded on demand)
+    ttr_table = attr.ib(default=None, type=typing.Optional[numpy.ndarray])
+
+    ## First time index at which each grid cell is member (-1 if never)
+    # HDF5: /data/wrapper/min_ttr/earliest_time_index (loaded on demand)
+    earliest_time_index = attr.ib(default=None, type=typing.Optional[numpy.ndarray])
+
     grad = attr.ib(default=None, type=typing.Optional[h5py.Group])
 
+    ## In-memory copy of the grad dataset for gradient vectors (loaded on demand)
+    grad_table = attr.ib(default=None, type=typing.Optional[numpy.ndarray])
+
     ## Massaged data groups (of datasets)
     group_wrapper = attr.ib(default=None, type=typing.Optional[h5py.Group])
     ## List of datasets with sparse boolean arrays
     group_subsets = attr.ib(default=None, type=typing.Optional[h5py.Group])
     ## List of datasets with sparse boolean arrays of convexified subsets
     group_subsets_convexified = attr.ib(default=None, type=typing.Optional[h5py.Group])
+    ## Projections of convexified subsets as axis pairs or pylevel.projection.Projection
+    # The first is stored in subsets_convexified, others in projections/<name>
+    projections = attr.ib(default=None, type=typing.Optional[typing.List])
+    ## Convexified subsets of projections other than the first
+    group_projections = attr.ib(default=None, type=typing.Optional[h5py.Group])
+
+    ## XY projections of subsets and references to them per time index
+    # HDF5: /data/wrapper/state_to_reachset/{projections_xy, projection_refs}
+    group_state_to_reachset = attr.ib(default=None, type=typing.Optional[h5py.Group])
+    ## Grid axes of x and y in XY projections (stored as attribute axes of projections_xy)
+    xy_axes = attr.ib(default=pylevel.projection.DEFAULT_AXES, type=tuple)
 
     ## Gradient data
     grad_dataset = attr.ib(default=None, type=typing.Optional[h5py.Group])
@@ -133,12 +153,82 @@ class ReachableSetWrapper:
     ## Expose storage requirements on initialisation
     verbosify_storage = attr.ib(default=True, type=bool)
 
+    ## Read value function lazily (per point or time slice) instead of at startup
+    lazy_value_function = attr.ib(default=True, type=bool)
+
+    ## Memory budget in bytes for streaming gradient blocks on initialisation
+    gradient_chunk_bytes = attr.ib(default=2**28, type=int)
+
+    ## Worker pool computing time indices in parallel on initialisation
+    initialisation_workers = attr.ib(default=1, type=int)
+    initialisation_executor = attr.ib(
+            default=pylevel.initialisation.ExecutorType.Process,
+            type=pylevel.initialisation.ExecutorType)
+    ## Flush completion markers to HDF5 every n time indices to resume interrupted initialisation
+    checkpoint_interval = attr.ib(default=10, type=int)
+
+    ## Compare content hashes of all time indices on startup to detect changed data
+    verify_initialisation = attr.ib(default=False, type=bool)
+
+    ## On-disk format of subsets chosen on initialisation
+    subset_format = attr.ib(
+            default=pylevel.storage.SubsetFormat.Dense,
+            type=pylevel.storage.SubsetFormat)
+
+    ## Grid axes spanned by each chunk of dense subsets (see reach_slice)
+    subset_plane_axes = attr.ib(default=pylevel.storage.SUBSET_PLANE_AXES, type=tuple)
+
+    ## Chunk layout and filters of lookup tables (min_ttr, grad), stored tables are rewritten on change
+    storage_layout = attr.ib(
+            default=pylevel.storage.StorageLayout.Default,
+            type=pylevel.storage.StorageLayout)
+    storage_compression = attr.ib(
+            default=pylevel.storage.Compression.Gzip,
+            type=pylevel.storage.Compression)
+
+    ## HDF5 chunk cache size in bytes and hash slots per dataset (rdcc_nbytes, rdcc_nslots)
+    chunk_cache_bytes = attr.ib(default=None, type=typing.Optional[int])
+    chunk_cache_slots = attr.ib(default=None, type=typing.Optional[int])
+
+    ## Never update the file, refuse it if not initialised (wrappers only write to copies)
+    read_only = attr.ib(default=False, type=bool)
+    ## Open file in single writer multiple reader mode (file written with SWMR)
+    swmr = attr.ib(default=False, type=bool)
+    ## HDF5 file locking (library default if None)
+    file_locking = attr.ib(default=None, type=typing.Optional[bool])
+
+    ## Byte budget of decoded subsets kept in memory by reach_at_t
+    subset_cache_bytes = attr.ib(default=2**26, type=int)
+    subset_cache = attr.ib(default=None, type=typing.Optional[pylevel.cache.LRUCache])
+
+    ## Byte budget of interpolators (per time slice and min_ttr) kept in memory
+    interpolator_cache_bytes = attr.ib(default=2**27, type=int)
+    interpolator_cache = attr.ib(default=None, type=typing.Optional[pylevel.cache.LRUCache])
+
+    ## Time indices with missing or outdated subsets (recomputed on initialisation)
+    stale_time_indices = attr.ib(default=None, type=typing.Optional[typing.List[int]])
+
+    ## Seconds spent per initialisation stage (after initialisation)
+    initialisation_timings = attr.ib(
+            default=None,
+            type=typing.Optional[pylevel.initialisation.StageTimings])
+
     def __attrs_post_init__(self):
-        ## Access HDF5 file
+        self.subset_cache = pylevel.cache.LRUCache(max_bytes=self.subset_cache_bytes)
+        self.interpolator_cache = pylevel.cache.LRUCache(max_bytes=self.interpolator_cache_bytes)
+
+        ## Access HDF5 file (opened read-only by all wrappers)
         self._access_data_file()
 
-        if not self.is_initialised or self.force_initialisation:
-            self._initialise_data()
+        ## Readers never initialise (data missing or outdated)
+        if self.read_only and (self.stale_time_indices or not self.is_initialised):
+            raise pylevel.error.WrapperNotInitialisedError(
+                    'Read-only wrapper of {} has {} stale time indices'.format(
+                        self.path, len(self.stale_time_indices)))
+
+        ## Write missing or outdated wrapper data to a copy replacing the file
+        if not self.read_only and self._requires_update():
+            self._update_data_file()
 
         ## TODO: Decide whether to load in-memory
         # self._activate_data()
@@ -154,7 +244,15 @@ class ReachableSetWrapper:
 
         ## Initialise common data handles
         self._activate_data_handles()
+        self._read_metadata()
+
+        print('Is initialised: ', self.is_initialised)
+        print('Force initialisation: ', self.force_initialisation)
+        print('Stale time indices: ', len(self.stale_time_indices))
+        self._debug('Memory usage: ', self.memory_usage())
 
+    def _read_metadata(self):
+        """ Recover meta data and stale time indices of the open file. """
         ## Fetch meta data from data group
         self.is_initialised = self.data_handle.attrs.get(
                 'is_initialised', False)
@@ -166,8 +264,83 @@ class ReachableSetWrapper:
             self.ttr = self.min_ttr_dataset["min_ttr"]
             self.grad = self.grad_dataset["grad"]
 
-        print('Is initialised: ', self.is_initialised)
-        print('Force initialisation: ', self.force_initialisation)
+        ## Time indices with missing or outdated subsets (all without wrapper data)
+        if self.group_wrapper is None:
+            self.stale_time_indices = list(range(len(self.time)))
+        else:
+            self.stale_time_indices = self._find_stale_time_indices()
+
+    def _requires_update(self) -> bool:
+        """ Return if wrapper data is missing, outdated or stored with another layout. """
+        if not self.is_initialised or self.stale_time_indices or self._find_missing_hulls():
+            return True
+        if self.group_state_to_reachset is None \
+                or "projection_refs" not in self.group_state_to_reachset \
+                or "earliest_time_index" not in self.min_ttr_dataset \
+                or not self._projections_xy_match():
+            return True
+        return bool(self._outdated_projection_groups() or self._outdated_tables())
+
+    def _update_path(self) -> str:
+        """ Return path of the copy of the data file being updated (next to it). """
+        directory, name = os.path.split(os.path.abspath(self.path))
+        return os.path.join(directory, '.{}.update'.format(name))
+
+    def _update_data_file(self):
+        """ Write wrapper data to a copy of the file, which then atomically replaces it.
+
+            Note:
+                Readers, also in other processes, keep reading the file they
+                opened and never observe partially written data, new readers
+                open either the former or the updated file. The copy needs
+                disk space for the whole file in the same directory. Copies
+                left by interrupted updates of the unchanged file are
+                resumed (see slice_complete).
+        """
+        path = os.path.abspath(self.path)
+        update_path = self._update_path()
+        source = os.stat(path)
+        signature = numpy.array([source.st_size, source.st_mtime_ns], dtype=numpy.int64)
+        self.file_handle.close()
+
+        ## Resume copy of interrupted update if the file did not change since
+        resume = False
+        if os.path.exists(update_path):
+            try:
+                with h5py.File(update_path, mode='r') as file_handle:
+                    resume = numpy.array_equal(file_handle['/data/wrapper'].attrs.get(
+                            'update_source', []), signature)
+            except (OSError, KeyError):
+                resume = False
+        if not resume:
+            shutil.copy2(path, update_path)
+        self._debug('Update {} in {} (resumed: {})'.format(path, update_path, resume))
+
+        try:
+            self._activate_data_handles(update_path, writable=True)
+            self.group_wrapper.attrs['update_source'] = signature
+            self._read_metadata()
+            self._apply_storage_layout()
+            if self.stale_time_indices or not self.is_initialised:
+                self._initialise_data()
+            else:
+                self._earliest_time_index()
+                if "projection_refs" not in self.group_state_to_reachset:
+                    self.build_state_to_reachset_index()
+            self._initialise_missing_hulls()
+            del self.group_wrapper.attrs['update_source']
+        finally:
+            if self.file_handle:
+                self.file_handle.close()
+        os.replace(update_path, path)
+
+        ## Reopen updated file for reading
+        self.ttr_table = None
+        self.earliest_time_index = None
+        self.grad_table = None
+        self.invalidate_subset_cache()
+        self.interpolator_cache.invalidate()
+        self._access_data_file()
 
     def _initialise_data(self):
         """ Initialise wrapper specific data. """
@@ -177,241 +350,405 @@ class ReachableSetWrapper:
         ## Fetch hdf5 data group
         data = self.data_handle
 
+        ## Mark data uninitialised until complete (resumed on interruption)
+        data.attrs['is_initialised'] = False
+        self.file_handle.flush()
+
         # States
         self._initialise_sets()
 
         ## Set data group metadata
         data.attrs['is_initialised'] = True
         data.attrs['timestamp_initialisation'] = time.time()
+        self.is_initialised = True
+        self.timestamp_initialisation = data.attrs['timestamp_initialisation']
         self._debug('Data initialised: \t{} (timestamp: {})'.format(
             data.attrs['is_initialised'],
             data.attrs['timestamp_initialisation']))
-        ## Close file
-        self.file_handle.close()
-
-        ## Reopen saved file
-        self._activate_data_handles()
-
-        ## Pre-access some data
-        self.ttr = self.min_ttr_dataset["min_ttr"]
-        self.grad = self.grad_dataset["grad"]
 
     def _initialise_sets(self):
         """ Iterate over discretised time and initialise corresponding ttr.
 
-            Todo:
-                Possible to collect all pending dask graphs as computation and
-                execute parallelised as from_delayed.
+            Note:
+                Only stale_time_indices are recomputed. Time indices are
+                computed on a pool of initialisation_workers processes (or
+                threads), while this process is the single writer to the HDF5
+                file. Per-stage timings are kept in initialisation_timings.
 
         """
 
         ## Fetch initialised grid utility
         grid = self.grid
 
-        ## Open HDF5 file for updates
-        # LEGACY data = h5py.File(self.path, mode='r+')
-        data = self.data_handle
-
         group_wrapper = self.group_wrapper
         group_subsets= self.group_subsets
-        group_subsets_convexified = self.group_subsets_convexified
         grad_dataset = self.grad_dataset
         min_ttr_dataset = self.min_ttr_dataset
 
-        self._debug('ReachableSetWrapper initialising data for {}'.format(
-            group_wrapper.keys()))
-
-        ## Ordered dictionary for time sequence preservance in ttr search
-        ## LEGACY tbs = 0
+        n_time = len(self.time)
+        stale_time_indices = sorted(self.stale_time_indices)
+        self._debug('ReachableSetWrapper initialising {} of {} time indices'.format(
+            len(stale_time_indices), n_time))
 
         ## Initialise reacheble set data utility
         state_set_data = pylevel.data.ReachableSetData(
                 grid=grid,
                 data_handle=self.data_handle)
 
-        ## Compute and store gradient
+        ## Invalidate markers of stale time indices before touching their data
+        slice_complete, slice_hashes = self._require_slice_markers(n_time)
+        complete = slice_complete[...]
+        complete[stale_time_indices] = False
+        slice_complete[...] = complete
+        self.file_handle.flush()
+
+        ## Remove subsets of time indices no longer present (also of unconfigured projections)
+        keys = set(group_subsets.keys())
+        keys.update(self.group_subsets_convexified.keys())
+        for group in self.group_projections.values():
+            keys.update(group.keys())
+        for key in keys:
+            if int(key) >= n_time:
+                self._reset_datasets_of_index(
+                        time_index=int(key),
+                        wrapper_data_handle=group_wrapper)
+
+        ## Compute and store gradient (central differences reach neighbouring time indices)
         ti = time.time()
-        vf = dask.array.from_array(state_set_data.at_all_time()).transpose()
-        grad = numpy.array([gradient.compute()
-                            for gradient in dask.array.gradient(vf)])
+        gradient_time_indices = set(
+                neighbour for time_index in stale_time_indices
+                for neighbour in (time_index - 1, time_index, time_index + 1)
+                if 0 <= neighbour < n_time)
+        self._initialise_gradient(
+                state_set_data.at_all_time(), grad_dataset, gradient_time_indices)
         self._debug('Gradient computation took : ', time.time() - ti)
-        grad_data = grad_dataset.require_dataset(
-                "grad",
-                grad.shape,
-                dtype='f',
-                compression='gzip')
-        grad_data[...] = grad
 
-        ## Initialize min ttr dask array
-        min_ttr_darray = float("inf") * dask.array.ones(state_set_data.value_function.shape)
+        ## Minimum time to reach (inf encodes never reached) and earliest
+        # time index of membership (-1 encodes never member) are reduced
+        # independent of order from stored and recomputed subsets
+        shape = state_set_data.value_function.shape
+        min_ttr = numpy.full(shape, float("inf"))
+        earliest_time_index = numpy.full(shape, -1, dtype=numpy.int16)
+
+        def reduce(time_index, subset_data):
+            numpy.minimum(min_ttr, self.time[time_index], out=min_ttr, where=subset_data)
+            earliest_time_index[numpy.logical_and(
+                subset_data,
+                numpy.logical_or(earliest_time_index < 0,
+                                 earliest_time_index > time_index))] = time_index
+
+        ti = time.time()
+        stale = set(stale_time_indices)
+        for time_index in range(n_time):
+            ## Empty subsets are not stored
+            if time_index in stale or str(time_index) not in group_subsets:
+                continue
+            reduce(time_index, pylevel.storage.read_subset(group_subsets[str(time_index)]))
+        self._debug('Reduction of unchanged subsets took : ', time.time() - ti)
+
+        ## Compute subsets on worker pool and store them from this process only
+        task = pylevel.initialisation.TimeSliceTask(
+                grid=grid, time=self.time, level=0.0, projections=self.projections)
+        timings = pylevel.initialisation.StageTimings()
+        results = pylevel.initialisation.map_time_slices(
+                task,
+                state_set_data.at_all_time(),
+                stale_time_indices,
+                workers=self.initialisation_workers,
+                executor_type=self.initialisation_executor,
+                timings=timings)
 
         t0 = time.time()
         ## TODO: Check the time sequence (t0 to tf or flipped)
-        for time_index, time_stamp in enumerate(self.time):
+        for count, result in enumerate(results):
+            time_index = result.time_index
+            time_stamp = self.time[time_index]
             print('{} - Compute level set at time: {}'.format(time.time() - t0, time_stamp))
-            stamp = time.time()
-            self._debug('Initialising time index {} of {}'.format(
-                time_index, len(self.time) - 1))
+            self._debug('Initialising time index {} of {} ({})'.format(
+                time_index, n_time - 1,
+                pylevel.initialisation.StageTimings(result.timings)))
 
+            ti = time.time()
             self._reset_datasets_of_index(
                     time_index=time_index,
                     wrapper_data_handle=group_wrapper)
 
-            ## Slice data of interest
-            state_set_data.at_time(time_index)
-            ti = time.time()
-            subset_mask = state_set_data.sublevel_mask(
-                    level=0.0,
-                    time_index=time_index)
-
-            self._debug('Subset mask took : ', time.time() - ti)
-
-            ## Compute dask graph
-            subset_data = subset_mask.compute()
-            self._debug('Subset mask computation  took : ', time.time() - ti)
-
-            ## Compute current ttr dask array
-            ttr_darray = subset_mask
-            ttr_darray[ttr_darray == False] = float("inf")
-            ttr_darray[ttr_darray == True] = time_stamp
-            min_ttr_darray = dask.array.fmin(min_ttr_darray, ttr_darray)
+            subset_data = result.subset
+            reduce(time_index, subset_data)
 
             ## Skip empty level sets
-            if not subset_data.any():
+            if not result.vertices:
                 print('Skip subset:')
-                continue
-
-            ## TODO: LEGACY (sparse) - Unused
-            # subset_mask.map_blocks(sparse.COO)
-            # subset_data = sparse.COO(subset_mask.compute())
-            # subset_data = subset_mask.compute()
-
-            ## Store sparse subset mask
-            # subset_mask.map_blocks(sparse.COO)
-            subset = group_subsets.require_dataset(
-                    str(time_index),
-                    subset_data.shape,
-                    dtype='?',
-                    compression='gzip')
-            subset[...] = subset_data
-
-            ## Return indices of active states
-            ti = time.time()
-            indices = dask.array.argwhere(subset_data).compute()
-            self._debug('Indices took : ', time.time() - ti)
-
-            ti = time.time()
-            ## Attempt to simplify state conversion by selecting only simplices
-            # Only useful if apply_along_axis conversion becomes not scalable
-            if False:
-                ## TODO: Test indices convexified
-                hull = ConvexHull(indices)
-                simplices = hull.points[hull.simplices.flat, :]
-                simplices = numpy.array(simplices)
-                ## print('Simplices shape: ', simplices.shape)
-
-                states = dask.array.apply_along_axis(
-                        grid.state,
-                        axis=1,
-                        arr=simplices).compute()
             else:
-                states = dask.array.apply_along_axis(
-                        grid.state,
-                        axis=1,
-                        arr=indices).compute()
-            self._debug('States took : ', time.time() - ti)
-
-            if True:
-                try:
-                    ti = time.time()
-                    ## Generate 2D projection of states
-                    print('Shape of states: ', states.shape)
-                    states_sliced = numpy.hstack([
-                        states[:, [0]],
-                        states[:, [2]]])
-
-                    hull = ConvexHull(states_sliced)
-                except Exception as e:
-                    import matplotlib.pyplot as plt
-                    # plt.plot(states_sliced)
-                    plt.scatter(x=states_sliced[:,[0]],y=states_sliced[:,[1]])
-                    plt.show()
-                    print('Shape of states: ', states_sliced.shape)
-
-
-                #vertices = [hull.points[[i], :].reshape(-1, 1)
-                #                 for i in hull.vertices]
-                vertices = hull.points[hull.vertices.flat, :]
-
-                vertices = numpy.squeeze(numpy.array(vertices))
-
-                subset_convexified = group_subsets_convexified.require_dataset(
+                ## Store subset mask in selected format
+                pylevel.storage.write_subset(
+                        group_subsets,
                         str(time_index),
-                        vertices.shape,
-                        dtype='f',
-                        compression='gzip')
-                subset_convexified[...] = vertices
-                self._debug('Dataset expansion took : ', time.time() - ti)
-
-                if False:
-                    import matplotlib.pyplot as plt
-
-                    plt.clf()
-                    plt.plot(states[:, 0], states[:, 2], 'ko', label='states')
-                    # vertices = subset_convexified[...]
-                    plt.plot(vertices[:, 0], vertices[:, 1], 'rx', label='vertices')
-
-                    plt.xlabel("x [m]")
-                    plt.ylabel("y [m]")
-                    plt.legend()
-                    plt.pause(.1)
-
-
-            ## TODO: Analyse size of data
-            def get_size(element):
-                binary = pickle.dumps(element, protocol=4)
-                return sys.getsizeof(binary)
-
-            # print('Subset true: ', subset_data_dense[indices])
-            # print(indices.compute()[...])
-            # print('Size of states: ', get_size(states))
-            # print('Size of indices: ', get_size(indices))
-            # print('Size of sparse: ', get_size(subset_data))
-
-            # print('Size of dense: ', get_size(subset_data_dense))
-            # Dense is almost factor 10x larger than sparse (But sparse should be todense on retrieval)
-
-            self._debug('--> Initialised in {}s'.format(time.time() - stamp))
-
-            ebs = 0
-            if False and self.verbosify_storage:
-                elements = level_set_dict.keys()
-                self._debug('----> Has elements: ', elements)
-                for e in elements:
-                    ## Element binary size
-                    ebs = get_size(level_set_dict[e])
-                    ## Total binary size
-                    tbs += ebs
-                    pass
-                    ## TODO:
-                    #self.debug('------> Element: {} \t size: {}'.format(
-                    #    e, sys.getsize
-                    #    ))
+                        subset_data,
+                        self.subset_format,
+                        self.subset_plane_axes)
 
-        ti = time.time()
-        min_ttr_array = min_ttr_darray.compute()
-        self._debug('Min TTR computation took : ', time.time() - ti)
-        min_ttr_data = min_ttr_dataset.require_dataset(
-                "min_ttr",
-                min_ttr_array.shape,
-                dtype='f',
-                compression='gzip')
-        min_ttr_data[...] = min_ttr_array
+                ## Store convexified subset of each projection
+                for index in range(len(self.projections)):
+                    self._write_hull(index, time_index, result.vertices)
+
+                self._write_projection_xy(time_index, subset_data)
+
+            ## Mark time index complete
+            slice_hashes[time_index] = result.digest
+            slice_complete[time_index] = True
+            if (count + 1) % self.checkpoint_interval == 0:
+                self.file_handle.flush()
+            timings.add('write', time.time() - ti)
+
+        self.initialisation_timings = timings
+        self._debug('Subsets initialised in {}s ({})'.format(time.time() - t0, timings))
+
+        self._write_table(min_ttr_dataset, "min_ttr", min_ttr, dtype='f')
+        self._write_table(min_ttr_dataset, "earliest_time_index", earliest_time_index, dtype='i2')
+        self.build_state_to_reachset_index()
 
         self._debug('Has initialised: ', self.group_subsets.keys())
         self._debug('Has initialised: (convexified) ', self.group_subsets_convexified.keys())
         self._debug('All sets initialised.')
 
+    def _write_hull(self, index : int, time_index : int, vertices : typing.Dict[str, numpy.ndarray]):
+        """ Store hull vertices of projection (by position) at time index. """
+        self._projection_group(index).create_dataset(
+                str(time_index),
+                data=vertices[self.projections[index].name],
+                dtype='f',
+                compression='gzip')
+
+    def _initialise_missing_hulls(self):
+        """ Store hulls of projections missing for stored subsets.
+
+            Note:
+                Hulls of added or changed projections are computed from the
+                stored subsets, without recomputing subsets, gradient or
+                lookup tables of their time indices.
+        """
+        for time_index, indices in sorted(self._find_missing_hulls().items()):
+            subset_data = pylevel.storage.read_subset(self.group_subsets[str(time_index)])
+            states = self.grid.states_from_indices(
+                    numpy.argwhere(pylevel.projection.boundary_mask(subset_data)))
+            vertices = pylevel.projection.project_hulls(
+                    states, [self.projections[index] for index in indices])
+            for index in indices:
+                self._write_hull(index, time_index, vertices)
+            self._debug('Initialised hulls of time index {} ({})'.format(
+                time_index, [self.projections[index].name for index in indices]))
+
+    def _write_table(self, group : h5py.Group, name : str, data : numpy.ndarray, dtype : str):
+        """ (Re)create lookup table dataset with storage layout and write data. """
+        if name in group:
+            del group[name]
+        options = pylevel.storage.dataset_options(
+                self.storage_layout,
+                self.storage_compression,
+                data.shape,
+                numpy.dtype(dtype).itemsize)
+        group.create_dataset(name, data=data, dtype=dtype, **options)
+
+    def _outdated_tables(self) -> typing.List[typing.Tuple[h5py.Group, str, bool, dict]]:
+        """ Return stored lookup tables whose chunks or filters differ from the storage layout.
+
+            Note:
+                Entries are the group, name, whether it is the gradient and
+                the dataset options of the storage layout.
+        """
+        tables = [(self.min_ttr_dataset, "min_ttr", False),
+                  (self.min_ttr_dataset, "earliest_time_index", False),
+                  (self.grad_dataset, "grad", True)]
+        outdated = list()
+        for group, name, is_gradient in tables:
+            dataset = None if group is None else group.get(name)
+            if dataset is None:
+                continue
+            options = pylevel.storage.dataset_options(
+                    self.storage_layout,
+                    self.storage_compression,
+                    dataset.shape,
+                    dataset.dtype.itemsize,
+                    is_gradient=is_gradient)
+            if not pylevel.storage.matches_options(dataset, options):
+                outdated.append((group, name, is_gradient, options))
+        return outdated
+
+    def _apply_storage_layout(self):
+        """ Rewrite lookup tables whose chunks or filters differ from the storage layout.
+
+            Note:
+                Tables are copied into a new dataset (grad in blocks of time
+                slices bounded by gradient_chunk_bytes), which then replaces
+                the stored one.
+        """
+        for group, name, is_gradient, options in self._outdated_tables():
+            dataset = group[name]
+            self._debug('Rewrite {} with storage layout {}'.format(
+                name, pylevel.storage.StorageLayout(self.storage_layout).name))
+            ## Remove copies of interrupted rewrites
+            if name + "_layout" in group:
+                del group[name + "_layout"]
+            copy = group.create_dataset(
+                    name + "_layout",
+                    dataset.shape,
+                    dtype=dataset.dtype,
+                    maxshape=dataset.maxshape,
+                    **options)
+            if is_gradient:
+                slice_bytes = int(numpy.prod(dataset.shape[1:-1])) * dataset.dtype.itemsize
+                block_length = max(1, self.gradient_chunk_bytes // slice_bytes)
+                for axis in range(dataset.shape[0]):
+                    for start in range(0, dataset.shape[-1], block_length):
+                        block = slice(start, start + block_length)
+                        copy[axis, ..., block] = dataset[axis, ..., block]
+            else:
+                copy[...] = dataset[...]
+            del group[name]
+            group.move(name + "_layout", name)
+        self.file_handle.flush()
+
+    def _require_slice_markers(self, n_time : int) -> typing.Tuple[h5py.Dataset, h5py.Dataset]:
+        """ Return per time index completion markers and content hashes.
+
+            Note:
+                Datasets are resized to the current time horizon, where
+                appended time indices are not complete.
+        """
+        markers = list()
+        for name, dtype in (("slice_complete", '?'), ("slice_hashes", 'S40')):
+            if name not in self.group_wrapper:
+                self.group_wrapper.create_dataset(
+                        name, (n_time, ), dtype=dtype, maxshape=(None, ))
+            dataset = self.group_wrapper[name]
+            if dataset.shape[0] != n_time:
+                dataset.resize((n_time, ))
+            markers.append(dataset)
+        return tuple(markers)
+
+    def _find_missing_hulls(self) -> typing.Dict[int, typing.List[int]]:
+        """ Return positions of configured projections lacking hulls per time index of stored subsets. """
+        n_time = len(self.time)
+        missing = dict()
+        for index in range(len(self.projections)):
+            group = self._projection_group(index)
+            for key in self.group_subsets.keys():
+                if int(key) < n_time and (group is None or key not in group):
+                    missing.setdefault(int(key), list()).append(index)
+        return missing
+
+    def _find_stale_time_indices(self) -> typing.List[int]:
+        """ Return time indices whose subsets are missing or outdated.
+
+            Note:
+                Content hashes are only compared if any marker is missing,
+                the time horizon changed or verify_initialisation is set.
+                Subsets of files initialised before completion markers are
+                kept, their lookup tables are rebuilt from them (see
+                _build_earliest_time_index).
+        """
+        n_time = len(self.time)
+        if self.force_initialisation and not self.read_only:
+            return list(range(n_time))
+        if "slice_complete" not in self.group_wrapper:
+            return [] if self.is_initialised else list(range(n_time))
+
+        stored_complete = self.group_wrapper["slice_complete"][...]
+        stored_hashes = self.group_wrapper["slice_hashes"][...]
+        complete = numpy.zeros(n_time, dtype=bool)
+        hashes = numpy.zeros(n_time, dtype='S40')
+        n_stored = min(n_time, len(stored_complete))
+        complete[:n_stored] = stored_complete[:n_stored]
+        hashes[:n_stored] = stored_hashes[:n_stored]
+
+        if complete.all() and len(stored_complete) == n_time \
+                and not self.verify_initialisation:
+            return []
+
+        value_function = self.data_handle['value_function']
+        stale_time_indices = [time_index for time_index in range(n_time)
+                if not complete[time_index]
+                or hashes[time_index] != pylevel.initialisation.slice_digest(
+                    value_function[time_index], self.time[time_index]).encode()]
+
+        ## Shortened horizon changes the gradient at the new final time index
+        if len(stored_complete) > n_time and n_time - 1 not in stale_time_indices:
+            stale_time_indices.append(n_time - 1)
+        return stale_time_indices
+
+    def _initialise_gradient(self, value_function, grad_dataset,
+            time_indices : typing.Optional[typing.Iterable[int]] = None):
+        """ Stream gradient of value function block-wise into HDF5.
+
+            Note:
+                Blocks span consecutive time slices and are extended by a halo
+                of one slice on each side, such that central differences along
+                time equal those of the gradient over the full array.
+                Peak memory is bounded by gradient_chunk_bytes, but a block
+                holds at least one time slice plus its halo.
+
+                Only time_indices are computed (all by default), unless the
+                stored dataset cannot be resized to the current horizon.
+
+        """
+        ## HDF5 value function is stored transposed (T, N_d, ..., N_1)
+        n_time = value_function.shape[0]
+        shape = tuple(reversed(value_function.shape))
+        dim = len(shape)
+        if time_indices is None:
+            time_indices = range(n_time)
+
+        ## Value function block and one gradient block per axis in float64
+        slice_bytes = int(numpy.prod(shape[:-1])) * numpy.dtype('f8').itemsize
+        block_length = max(1, self.gradient_chunk_bytes // (slice_bytes * (dim + 1)) - 2)
+        self._debug('Stream gradient in blocks of {} time slices'.format(block_length))
+
+        ## Resize along time or recreate gradient dataset (e.g. on layout change)
+        options = pylevel.storage.dataset_options(
+                self.storage_layout,
+                self.storage_compression,
+                (dim, ) + shape,
+                numpy.dtype('f').itemsize,
+                is_gradient=True)
+        grad_data = grad_dataset.get("grad")
+        if grad_data is not None and not pylevel.storage.matches_options(grad_data, options):
+            del grad_dataset["grad"]
+            grad_data = None
+        if grad_data is not None and grad_data.shape != (dim, ) + shape:
+            if grad_data.shape[:-1] == (dim, ) + shape[:-1] and grad_data.maxshape[-1] is None:
+                grad_data.resize((dim, ) + shape)
+            else:
+                del grad_dataset["grad"]
+                grad_data = None
+        if grad_data is None:
+            grad_data = grad_dataset.create_dataset(
+                    "grad",
+                    (dim, ) + shape,
+                    dtype='f',
+                    maxshape=(dim, ) + shape[:-1] + (None, ),
+                    **options)
+            time_indices = range(n_time)
+
+        ## Split time indices into blocks of consecutive time indices
+        blocks = list()
+        for time_index in sorted(set(time_indices)):
+            if blocks and blocks[-1][1] == time_index \
+                    and blocks[-1][1] - blocks[-1][0] < block_length:
+                blocks[-1][1] += 1
+            else:
+                blocks.append([time_index, time_index + 1])
+
+        for start, stop in blocks:
+            halo_start = max(start - 1, 0)
+            halo_stop = min(stop + 1, n_time)
+
+            block = numpy.asarray(
+                    value_function[halo_start:halo_stop], dtype='f8').transpose()
+            interior = slice(start - halo_start, stop - halo_start)
+            for axis, gradient in enumerate(numpy.gradient(block)):
+                grad_data[axis, ..., start:stop] = gradient[..., interior]
+
     def _reset_datasets_of_index(self, time_index, wrapper_data_handle):
         """ Resets datasets in existing HDF5 wrapper data group. """
         ## Reset existing wrapper datasets
@@ -424,10 +761,33 @@ class ReachableSetWrapper:
         ## Not needed delete_wrapper_data('states', str(time_index))
         delete_wrapper_data('subsets', str(time_index))
         delete_wrapper_data('subsets_convexified', str(time_index))
+        ## Hulls of projections not configured now would be outdated once configured again
+        for name in wrapper_data_handle.get('projections', dict()):
+            delete_wrapper_data('projections/' + name, str(time_index))
+        delete_wrapper_data('state_to_reachset/projections_xy', str(time_index))
+        self.invalidate_subset_cache(time_index)
+
+    def _activate_data_handles(self, path : typing.Optional[str] = None, writable : bool = False):
+        """ Open HDF5 file (data file if no path) and fetch data handles.
 
-    def _activate_data_handles(self):
-        ## Open HDF5 file in read / write mode with H5FD_SEC2 driver (on-disk)
-        file_handle = h5py.File(self.path, mode='r+')
+            Note:
+                Only copies of the data file are opened for writing (see
+                _update_data_file), the data file is always opened with
+                mode 'r' such that any number of processes can read it.
+        """
+        ## Open HDF5 file with H5FD_SEC2 driver (on-disk)
+        ## HDF5 chunk cache per dataset (library default if not set)
+        chunk_cache = dict()
+        if self.chunk_cache_bytes is not None:
+            chunk_cache['rdcc_nbytes'] = self.chunk_cache_bytes
+        if self.chunk_cache_slots is not None:
+            chunk_cache['rdcc_nslots'] = self.chunk_cache_slots
+        if writable:
+            file_handle = h5py.File(path, mode='r+',
+                                    locking=self.file_locking, **chunk_cache)
+        else:
+            file_handle = h5py.File(self.path if path is None else path, mode='r',
+                                    swmr=self.swmr, locking=self.file_locking, **chunk_cache)
         self.file_handle = file_handle
         data_handle = file_handle['/data']
         self.data_handle = data_handle
@@ -443,7 +803,11 @@ class ReachableSetWrapper:
                 debug_is_enabled=self.visualise_grid)
 
         ## Retrieve general data groups (ds, dt)
-        self.value_function = numpy.array(dask.array.from_array(data_handle['value_function']).transpose())
+        if self.lazy_value_function:
+            self.value_function = pylevel.data.LazyValueFunction(
+                    dataset=data_handle['value_function'])
+        else:
+            self.value_function = numpy.array(dask.array.from_array(data_handle['value_function']).transpose())
         ## TBD: self.gradient = dask.array.from_array(data['gradient'])
         # self.grad = numpy.gradient(self.value_function)
         ## Available time discretisation indices
@@ -456,19 +820,151 @@ class ReachableSetWrapper:
 
         ## TODO: Find maximal ttr that is computed
         self.maximum_time_to_reach = self.time[-1]
+
+        ## Resolve projections of convexified subsets
+        self.projections = [
+                pylevel.projection.Projection.resolve(projection, len(self.grid.dx))
+                for projection in (self.projections or [pylevel.projection.DEFAULT_AXES])]
+
+        ## Read-only access requires the wrapper data groups of an initialisation
+        if writable:
+            require_group = lambda group, name: group.require_group(name)
+        elif "wrapper" in data_handle:
+            require_group = lambda group, name: group[name]
+        elif self.read_only:
+            raise pylevel.error.WrapperNotInitialisedError(
+                    'No wrapper data in read-only file: {}'.format(self.path))
+        else:
+            ## Created in the updated copy
+            self.group_wrapper = None
+            return
+
         ## Initialise wrapper specific data groups
         ## Create wrapper data group to add datasets
-        self.group_wrapper = data_handle.require_group("wrapper")
+        self.group_wrapper = require_group(data_handle, "wrapper")
         ## Use to check membership
         # (dimensionality: argwhere encoding state membership) -> CSC sparse
         # (value function: boolean array)
-        self.group_subsets = self.group_wrapper.require_group("subsets")
+        self.group_subsets = require_group(self.group_wrapper, "subsets")
         ## For illustration purposes
         # same as above : convexified states
-        self.group_subsets_convexified = self.group_wrapper.require_group("subsets_convexified")
-        self.min_ttr_dataset = self.group_wrapper.require_group("min_ttr")
-        self.grad_dataset = self.group_wrapper.require_group("grad")
+        self.group_subsets_convexified = require_group(self.group_wrapper, "subsets_convexified")
+        self.min_ttr_dataset = require_group(self.group_wrapper, "min_ttr")
+        self.grad_dataset = require_group(self.group_wrapper, "grad")
+        ## Added after the first file format (optional for reading)
+        if writable:
+            self.group_state_to_reachset = self.group_wrapper.require_group("state_to_reachset")
+            self._require_projections_xy()
+            self.group_projections = self.group_wrapper.require_group("projections")
+            self._require_projection_groups()
+        else:
+            self.group_state_to_reachset = self.group_wrapper.get("state_to_reachset")
+            self.group_projections = self.group_wrapper.get("projections")
+
+    def _file_is_writable(self) -> bool:
+        """ Return if the open file is a copy being updated (mode 'r+'). """
+        return self.file_handle.mode == 'r+'
+
+    def _projection_group(self, index : int) -> typing.Optional[h5py.Group]:
+        """ Return group of convexified subsets of projection (by position, None if missing). """
+        if index == 0:
+            return self.group_subsets_convexified
+        if self.group_projections is None:
+            return None
+        return self.group_projections.get(self.projections[index].name)
+
+    def _projection_group_matches(self, group : h5py.Group, projection) -> bool:
+        """ Return if group stores hulls of projection (or none with another matrix). """
+        matrix = group.attrs.get('matrix')
+        ## Former files store the default projection without matrix
+        if matrix is None and group.name.endswith('subsets_convexified'):
+            matrix = pylevel.projection.Projection.from_axes(
+                    pylevel.projection.DEFAULT_AXES, len(self.grid.dx)).matrix
+        if matrix is None:
+            return len(group) == 0
+        return numpy.shape(matrix) == projection.matrix.shape \
+            and numpy.allclose(matrix, projection.matrix)
+
+    def _outdated_projection_groups(self) -> bool:
+        """ Return if any group of configured projections is missing or has another matrix. """
+        for index, projection in enumerate(self.projections):
+            group = self._projection_group(index)
+            if group is None or not self._projection_group_matches(group, projection):
+                return True
+        return False
+
+    def _projections_xy_match(self) -> bool:
+        """ Return if stored XY projections span xy_axes.
+
+            Note:
+                Former files store projections onto axes 0 and 1 without
+                the axes attribute.
+        """
+        axes = self.group_state_to_reachset["projections_xy"].attrs.get('axes', (0, 1))
+        return tuple(int(axis) for axis in axes) == tuple(self.xy_axes)
+
+    def _require_projections_xy(self):
+        """ Create group of XY projections and clear it if xy_axes changed. """
+        group = self.group_state_to_reachset.require_group("projections_xy")
+        if not self._projections_xy_match():
+            for key in list(group.keys()):
+                del group[key]
+            if "projection_refs" in self.group_state_to_reachset:
+                del self.group_state_to_reachset["projection_refs"]
+        group.attrs['axes'] = tuple(self.xy_axes)
+
+    def _require_projection_groups(self):
+        """ Create groups of projections and clear them if their matrix changed. """
+        for index, projection in enumerate(self.projections):
+            if index > 0:
+                self.group_projections.require_group(projection.name)
+            group = self._projection_group(index)
+            if not self._projection_group_matches(group, projection):
+                for key in list(group.keys()):
+                    del group[key]
+            group.attrs['matrix'] = projection.matrix
+
+
+    def memory_usage(self) -> typing.Dict[str, int]:
+        """ Return bytes of data held in memory by the wrapper.
+
+            Note:
+                Includes the peak resident set size of the process (where
+                available) to confirm savings of the lazy value function.
+        """
+        usage = dict()
+        if isinstance(self.value_function, pylevel.data.LazyValueFunction):
+            usage['value_function'] = self.value_function.nbytes_loaded
+        elif self.value_function is not None:
+            usage['value_function'] = self.value_function.nbytes
+        usage['ttr_table'] = 0 if self.ttr_table is None else self.ttr_table.nbytes
+        usage['grad_table'] = 0 if self.grad_table is None else self.grad_table.nbytes
+        usage['earliest_time_index'] = 0 if self.earliest_time_index is None \
+                else self.earliest_time_index.nbytes
+        usage['subset_cache'] = self.subset_cache.nbytes
+        usage['interpolator_cache'] = self.interpolator_cache.nbytes
+        usage['total'] = sum(usage.values())
+
+        try:
+            import resource
+            ## Linux reports kilobytes
+            usage['peak_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except ImportError:
+            pass
+        return usage
+
+    def export_tables(self, directory : str) -> str:
+        """ Export lookup tables for memory-mapped serving (see pylevel.tables).
+
+            Note:
+                Load with ReachableSetTables.load(directory) in any number of
+                processes without opening the HDF5 file.
+        """
+        return pylevel.tables.ReachableSetTables.from_wrapper(self).export(directory)
 
+    def query(self, load_gradient : bool = True) -> 'pylevel.query.ReachableSetQuery':
+        """ Return thread-safe query facade serving lookups from in-memory tables. """
+        return pylevel.query.ReachableSetQuery(wrapper=self, load_gradient=load_gradient)
 
     def _debug(self, *args):
         """ Print debug messages if debugging is enabled. """
@@ -476,10 +972,139 @@ class ReachableSetWrapper:
             print("LevelSetWrapper: ", *args)
 
     def reach_at_t_idx(self, t_idx : int, convexified=False):
-        """ Return reachable state set at time_idx. """
+        """ Return reachable state set at time_idx.
+
+            Note:
+                Decoded sets are served read-only from the subset cache.
+        """
         if convexified:
-            return self.group_subsets_convexified[str(t_idx)][...]
-        return self.group_subsets[str(t_idx)][...]
+            load = lambda: self.group_subsets_convexified[str(t_idx)][...]
+        else:
+            load = lambda: pylevel.storage.read_subset(self.group_subsets[str(t_idx)])
+        return self.subset_cache.get((int(t_idx), convexified), load)
+
+    def _project_xy(self, subset_data : numpy.ndarray) -> numpy.ndarray:
+        """ Return projection (N_x, N_y) of subset onto the grid axes xy_axes. """
+        x_axis, y_axis = self.xy_axes
+        projection = subset_data.any(axis=tuple(
+                axis for axis in range(subset_data.ndim) if axis not in self.xy_axes))
+        return projection.T if x_axis > y_axis else projection
+
+    def _write_projection_xy(self, time_index : int, subset_data : numpy.ndarray) -> h5py.Dataset:
+        """ Store projection of subset onto the XY plane (see xy_axes). """
+        return self.group_state_to_reachset["projections_xy"].create_dataset(
+                str(time_index), data=self._project_xy(subset_data), dtype='?', compression='gzip')
+
+    def build_state_to_reachset_index(self):
+        """ Store missing XY projections of subsets and references to all of them.
+
+            Note:
+                Replaces the former build_state_to_reachset_dict. Each grid
+                cell maps to its first containing reachable set by the
+                earliest time index, whose XY projection is referenced by
+                projection_refs[time_index] (null if the set is empty).
+        """
+        group = self.group_state_to_reachset
+        projections = group["projections_xy"]
+        if "projection_refs" in group:
+            del group["projection_refs"]
+        refs = group.create_dataset(
+                "projection_refs", (len(self.time), ), dtype=h5py.ref_dtype)
+
+        for time_index in range(len(self.time)):
+            ## Empty subsets are not stored
+            if str(time_index) not in self.group_subsets:
+                continue
+            if str(time_index) not in projections:
+                self._write_projection_xy(time_index, self.reach_at_t_idx(time_index))
+            refs[time_index] = projections[str(time_index)].ref
+
+    def projection_xy(self, t_idx : int) -> numpy.ndarray:
+        """ Return XY projection (N_x, N_y) of reachable set at time index onto xy_axes.
+
+            Note:
+                Projections missing in files of older initialisations are
+                computed from the subset (and stored while updating the file).
+        """
+        def load():
+            group = self.group_state_to_reachset
+            if group is not None and str(t_idx) in group["projections_xy"] \
+                    and self._projections_xy_match():
+                return group["projections_xy"][str(t_idx)][...]
+            subset_data = self.reach_at_t_idx(t_idx)
+            if not self._file_is_writable():
+                return self._project_xy(subset_data)
+            return self._write_projection_xy(t_idx, subset_data)[...]
+        return self.subset_cache.get((int(t_idx), 'xy'), load)
+
+    def state_to_reachset(self, state : numpy.ndarray) -> typing.Tuple[int, numpy.ndarray]:
+        """ Return first time index whose reachable set contains state and its XY projection. """
+        t_idx = self._earliest_time_index()[self.grid.index_valid(state)]
+        if t_idx < 0:
+            raise pylevel.error.StateNotReachableError()
+        return int(t_idx), self.projection_xy(t_idx)
+
+    def state_to_reachset_batch(self, states : numpy.ndarray) -> numpy.ndarray:
+        """ Return first time index containing each row of states (N x d) (-1 if none).
+
+            Note:
+                Look up the XY projections of the returned time indices
+                with projection_xy.
+        """
+        flat, mask = self.grid.flat_index_batch(states)
+        time_idx = numpy.full(mask.shape, -1, dtype=numpy.int16)
+        time_idx[mask] = numpy.take(self._earliest_time_index(), flat[mask])
+        return time_idx
+
+    def projected_hull_at_t_idx(self, t_idx : int, name : str) -> numpy.ndarray:
+        """ Return vertices of convexified subset of projection name at time index. """
+        for index, projection in enumerate(self.projections):
+            if projection.name == name:
+                group = self._projection_group(index)
+                return self.subset_cache.get(
+                        (int(t_idx), name), lambda: group[str(t_idx)][...])
+        raise KeyError('Unknown projection: {}'.format(name))
+
+    def _subset_contains(self, t_idx : int, indices : numpy.ndarray) -> numpy.ndarray:
+        """ Return membership of grid indices (N x d) in subset of time index.
+
+            Note:
+                Tests membership on the stored (e.g. bit-packed) form, which is
+                cached without decoding.
+        """
+        ## Empty subsets are not stored
+        if str(t_idx) not in self.group_subsets:
+            return numpy.zeros(len(indices), dtype=bool)
+
+        dataset = self.group_subsets[str(t_idx)]
+        encoded = self.subset_cache.get((int(t_idx), 'encoded'), lambda: dataset[...])
+        return pylevel.storage.contains(
+                encoded, *pylevel.storage.encoding_of(dataset), indices)
+
+    def is_member_at_t(self, states : numpy.ndarray, t : float) -> numpy.ndarray:
+        """ Return membership of each row of states (N x d) in reachable set at time t.
+
+            Note:
+                Rows outside of the grid are not members.
+        """
+        t_idx = numpy.abs(numpy.array(self.time) - t).argmin()
+        if t > self.time[-1]:
+            self._debug('State not reachable within time: {}'.format(t))
+            raise pylevel.error.StateNotReachableError()
+
+        indices, mask = self.grid.index_batch(states)
+        is_member = numpy.zeros(mask.shape, dtype=bool)
+        is_member[mask] = self._subset_contains(t_idx, indices[mask])
+        return is_member
+
+    def invalidate_subset_cache(self, t_idx : typing.Optional[int] = None):
+        """ Drop cached sets of time index (all if None), e.g. after re-initialisation. """
+        if t_idx is None:
+            self.subset_cache.invalidate()
+            return
+        kinds = [False, True, 'encoded', 'xy'] + [projection.name for projection in self.projections]
+        for kind in kinds:
+            self.subset_cache.invalidate((int(t_idx), kind))
 
     def reach_at_t(self,
             t : float,
@@ -499,42 +1124,70 @@ class ReachableSetWrapper:
 
         return self.reach_at_t_idx(t_idx, convexified)
 
-    def reach_at_min_ttr(self,
-            state : numpy.ndarray,
-            convexified : bool=False):
-        """ Return minimial time to reach set and its discretised time. """
-
-        state_key = "states_convexified" if convexified else "states"
+    def reach_slice_at_t_idx(self,
+            t_idx : int,
+            fixed : typing.Dict[int, float]) -> typing.Tuple[numpy.ndarray, typing.List[float]]:
+        """ Return cross-section of reachable set at time index and its extent.
 
+            Note:
+                Axes in fixed are held at the grid cell of the given state
+                value, the remaining (free) axes span the slice. The extent
+                lists [min, max] of each free axis, e.g. [x_min, x_max,
+                y_min, y_max] for the XY plane. Only the hyperslab is read
+                from HDF5 instead of the whole subset.
+        """
+        state = numpy.array(self.grid.x_min, dtype=float)
+        for axis, value in fixed.items():
+            state[axis] = value
         index = self.grid.index_valid(state)
 
-        ## Verify that time is closest to furthest
-        # Assume goal set is not avoid set
+        dim = len(self.grid.dx)
+        selection = tuple(index[axis] if axis in fixed else slice(None) for axis in range(dim))
+        free_axes = [axis for axis in range(dim) if axis not in fixed]
+        extent = [float(bound) for axis in free_axes
+                  for bound in (self.grid.x_min[axis], self.grid.x_max[axis])]
 
-        for t_idx, time_i in enumerate(self.time):
-            self._debug('ReachableSetWrapper: Find min reach TTR at time index: {} at time {}s'.format(t_idx, time_i))
-            try:
-                state_set = self.group_subsets[str(t_idx)]
+        ## Empty subsets are not stored
+        if str(t_idx) not in self.group_subsets:
+            shape = tuple(int(self.grid.N[axis]) for axis in free_axes)
+            return numpy.zeros(shape, dtype=bool), extent
 
-                if not state_set[index]:
-                    continue
-                self._debug('ReachableSetWrapper: Found state {} at time {}'.format(state, time_i))
+        dataset = self.group_subsets[str(t_idx)]
+        encoded = None
+        if pylevel.storage.encoding_of(dataset)[0] != pylevel.storage.SubsetFormat.Dense:
+            encoded = self.subset_cache.get((int(t_idx), 'encoded'), lambda: dataset[...])
+        return pylevel.storage.read_subset_slice(dataset, selection, encoded), extent
 
-                if convexified:
-                    state_set = self.group_subsets_convexified[str(t_idx)][...]
+    def reach_slice(self,
+            t : float,
+            fixed : typing.Dict[int, float]) -> typing.Tuple[numpy.ndarray, typing.List[float]]:
+        """ Return cross-section of reachable set at time t with axes fixed at state values.
 
-                self._debug('ReachableSetWrapper: Min reach TTR state found in ', time_i)
+            Note:
+                E.g. fixed={2: yaw, 3: v} returns the XY slice (N_1, N_2)
+                and its extent [x_min, x_max, y_min, y_max].
+        """
+        if t > self.time[-1]:
+            self._debug('State not reachable within time: {}'.format(t))
+            raise pylevel.error.StateNotReachableError()
 
-                return state_set, time_i
-            except (LookupError, ValueError) as e:
-                pass
-                # import traceback
-                # self._debug(traceback.print_tb(e.__traceback__))
+        t_idx = numpy.abs(numpy.array(self.time) - t).argmin()
+        return self.reach_slice_at_t_idx(t_idx, fixed)
 
-        self._debug('ReachableSetWrapper: Failed to find index in any set.',
-            'Unreachable state.')
+    def reach_at_min_ttr(self,
+            state : numpy.ndarray,
+            convexified : bool=False):
+        """ Return minimial time to reach set and its discretised time. """
+        index = self.grid.index_valid(state)
+        t_idx = self._earliest_time_index()[index]
+
+        if t_idx < 0:
+            self._debug('ReachableSetWrapper: Failed to find index in any set.',
+                'Unreachable state.')
+            raise pylevel.error.StateNotReachableError()
 
-        raise pylevel.error.StateNotReachableError()
+        self._debug('ReachableSetWrapper: Min reach TTR state found in ', self.time[t_idx])
+        return self.reach_at_t_idx(t_idx, convexified), self.time[t_idx]
 
     def min_ttr(self, state : numpy.ndarray):
         """ Return minimal time to reach discretized time.
@@ -544,30 +1197,146 @@ class ReachableSetWrapper:
         index = self.grid.index_valid(state)
         return self.ttr[index]
 
-    def is_member(self, state: numpy.ndarray, return_time_to_reach=False) -> numpy.float:
-        """ Return if state is not member of any reachable state sets. """
+    def _ttr_table(self) -> numpy.ndarray:
+        """ Return in-memory minimal time to reach table (read once from HDF5). """
+        if self.ttr_table is None:
+            self.ttr_table = self.ttr[...]
+        return self.ttr_table
+
+    def min_ttr_batch(self,
+            states : numpy.ndarray,
+            return_mask : bool = False):
+        """ Return minimal time to reach for each row of states (N x d).
+
+            Note:
+                Rows outside of the grid are returned as NaN instead of raising
+                IndexNotInGridError. Optionally return the mask of valid rows.
+        """
+        flat, mask = self.grid.flat_index_batch(states)
+        ttr = numpy.full(mask.shape, numpy.nan)
+        ttr[mask] = numpy.take(self._ttr_table(), flat[mask])
+
+        if return_mask:
+            return ttr, mask
+        return ttr
+
+    def _interpolator(self, t_idx : typing.Optional[int] = None) -> pylevel.data.GridInterpolator:
+        """ Return cached interpolator of value function at time index (min_ttr if None). """
+        if t_idx is None:
+            return self.interpolator_cache.get('min_ttr', lambda: pylevel.data.GridInterpolator(
+                grid=self.grid, table=self._ttr_table()))
+        return self.interpolator_cache.get(int(t_idx), lambda: pylevel.data.GridInterpolator(
+            grid=self.grid, table=self.value_function[..., int(t_idx)]))
+
+    def min_ttr_interpolated(self, states : numpy.ndarray) -> numpy.ndarray:
+        """ Return multilinearly interpolated minimal time to reach of states (N x d).
+
+            Note:
+                Rows outside of the grid are NaN, rows next to never reached
+                cells are infinite (see GridInterpolator).
+        """
+        return self._interpolator()(states)
+
+    def value_interpolated(self,
+            states : numpy.ndarray,
+            t : float,
+            time_continuous : bool = False) -> numpy.ndarray:
+        """ Return multilinearly interpolated value function at time t of states (N x d).
+
+            Note:
+                Uses the time index nearest to t or, if time continuous,
+                interpolates linearly between the adjacent time indices.
+                Rows outside of the grid are NaN.
+        """
+        if t > self.time[-1]:
+            self._debug('State not reachable within time: {}'.format(t))
+            raise pylevel.error.StateNotReachableError()
+
+        if not time_continuous:
+            t_idx = numpy.abs(numpy.array(self.time) - t).argmin()
+            return self._interpolator(t_idx)(states)
+
+        ## Adjacent time indices (clamped to the first time stamp)
+        t_idx = int(numpy.clip(numpy.searchsorted(self.time, t, side='right') - 1,
+                               0, max(len(self.time) - 2, 0)))
+        if len(self.time) == 1 or t <= self.time[t_idx]:
+            return self._interpolator(t_idx)(states)
+        weight = (t - self.time[t_idx]) / (self.time[t_idx + 1] - self.time[t_idx])
+        return (1.0 - weight) * self._interpolator(t_idx)(states) \
+            + weight * self._interpolator(t_idx + 1)(states)
+
+    def _earliest_time_index(self) -> numpy.ndarray:
+        """ Return in-memory earliest time index of membership for each grid cell. """
+        if self.earliest_time_index is None:
+            if "earliest_time_index" in self.min_ttr_dataset:
+                self.earliest_time_index = self.min_ttr_dataset["earliest_time_index"][...]
+            else:
+                self.earliest_time_index = self._build_earliest_time_index()
+        return self.earliest_time_index
+
+    def _build_earliest_time_index(self) -> numpy.ndarray:
+        """ Build and store earliest time index from subsets of older initialisations.
+
+            Note:
+                Also rebuilds min_ttr, whose stored values collapsed to a
+                single time in these files.
+        """
+        self._debug('Build earliest time index and min_ttr from stored subsets')
+        earliest_time_index = numpy.full(self.ttr.shape, -1, dtype=numpy.int16)
+        for time_index in range(len(self.time)):
+            ## Empty subsets are not stored
+            if str(time_index) not in self.group_subsets:
+                continue
+            subset_data = pylevel.storage.read_subset(self.group_subsets[str(time_index)])
+            earliest_time_index[numpy.logical_and(
+                earliest_time_index < 0, subset_data)] = time_index
+
+        ## Time is increasing, hence the earliest time index holds the minimum time to reach
+        min_ttr = numpy.full(earliest_time_index.shape, float("inf"), dtype='f')
+        is_member = earliest_time_index >= 0
+        min_ttr[is_member] = self.time[earliest_time_index[is_member]]
+        self.ttr_table = min_ttr
+
+        ## Keep the rebuilt tables in memory only unless updating the file
+        if self._file_is_writable():
+            self._write_table(self.min_ttr_dataset, "earliest_time_index",
+                              earliest_time_index, dtype='i2')
+            self._write_table(self.min_ttr_dataset, "min_ttr", min_ttr, dtype='f')
+            self.ttr = self.min_ttr_dataset["min_ttr"]
+        return earliest_time_index
+
+    def is_member(self, state: numpy.ndarray, return_time_to_reach=False) -> bool:
+        """ Return if state is member of any reachable state sets. """
         index = self.grid.index_valid(state.flatten())
+        time_idx = self._earliest_time_index()[index]
 
-        for time_idx, time_i in enumerate(self.time):
-            try:
-                state_set = self.group_subsets[str(time_idx)][...]
-                if not state_set[index]:
-                    continue
+        if time_idx < 0:
+            self._debug('ReachableSetWrapper: Failed to find index in any set.')
+            raise pylevel.error.StateNotReachableError()
 
-                # print('Found member of ', self.state_set_type, ' (at time {})'.format(time_i))
+        if return_time_to_reach:
+            return True, self.time[time_idx]
+        return True
 
-                if return_time_to_reach:
-                    return True, time_i
+    def is_member_batch(self,
+            states : numpy.ndarray,
+            return_time_to_reach : bool = False):
+        """ Return membership in any reachable set for each row of states (N x d).
 
-                return True
-            except LookupError as e:
-                # self._debug("Failed to find index in {}".format(time_idx))
-                pass
+            Note:
+                Rows outside of the grid or of any reachable set are not
+                members. Optionally return their time to reach (NaN if no member).
+        """
+        time_idx = self.state_to_reachset_batch(states)
+        is_member = time_idx >= 0
 
-        self._debug('ReachableSetWrapper: Failed to find index in any set.')
-        raise pylevel.error.StateNotReachableError()
+        if return_time_to_reach:
+            time_to_reach = numpy.full(time_idx.shape, numpy.nan)
+            time_to_reach[is_member] = self.time[time_idx[is_member]]
+            return is_member, time_to_reach
+        return is_member
 
-    def is_not_member(self, state: numpy.ndarray) -> numpy.float:
+    def is_not_member(self, state: numpy.ndarray) -> bool:
         """ Return if state is not member of any reachable state sets. """
 
         return not self.is_member(state)
@@ -593,6 +1362,119 @@ class ReachableSetWrapper:
                 # grad = grad / most_positive_grad
         return grad
 
+    def _grad_table(self) -> numpy.ndarray:
+        """ Return in-memory gradient table (d + 1, N_1, ..., N_d, T) (read once from HDF5). """
+        if self.grad_table is None:
+            self.grad_table = self.grad[...]
+        return self.grad_table
+
+    def gradient_vector(self,
+            states : numpy.ndarray,
+            ttrs : numpy.ndarray,
+            axes : typing.Optional[typing.List[int]] = None,
+            interpolated : bool = False) -> numpy.ndarray:
+        """ Return gradient of states (N x d) at times ttrs along axes (N x len(axes)).
+
+            Note:
+                Defaults to all state axes (the last gradient axis is the
+                time derivative). Times snap to the nearest time index as in
+                gradient(). Gradients are gathered from the nearest grid point
+                or, if interpolated, multilinearly interpolated. Rows outside
+                of the grid are NaN. A single state (d) returns (len(axes)).
+        """
+        states = numpy.asarray(states, dtype=float)
+        is_single = states.ndim == 1
+        states = states.reshape(-1, len(self.grid.dx))
+        axes = numpy.arange(len(self.grid.dx)) if axes is None else numpy.asarray(axes)
+        time_indices = self._nearest_time_indices(ttrs, len(states))
+
+        grad_table = self._grad_table()
+        grad = numpy.full((len(states), len(axes)), numpy.nan)
+        if interpolated:
+            for time_index in numpy.unique(time_indices):
+                rows = time_indices == time_index
+                for column, axis in enumerate(axes):
+                    interpolator = self.interpolator_cache.get(
+                            ('grad', int(axis), int(time_index)),
+                            lambda: pylevel.data.GridInterpolator(
+                                grid=self.grid, table=grad_table[axis, ..., time_index]))
+                    grad[rows, column] = interpolator(states[rows])
+        else:
+            flat, mask = self.grid.flat_index_batch(states)
+            grad[mask] = self._gradient_at_cells(flat[mask], time_indices[mask], axes)
+
+        return grad[0] if is_single else grad
+
+    def _nearest_time_indices(self, times, count : int) -> numpy.ndarray:
+        """ Return nearest time index of times (scalar or count) for count rows. """
+        time = numpy.asarray(self.time)
+        times = numpy.broadcast_to(numpy.asarray(times, dtype=float), (count, ))
+        return numpy.abs(time[numpy.newaxis, :] - times[:, numpy.newaxis]).argmin(axis=1)
+
+    def _gradient_at_cells(self,
+            flat : numpy.ndarray,
+            time_indices : numpy.ndarray,
+            axes : numpy.ndarray) -> numpy.ndarray:
+        """ Return gradient (N x len(axes)) of flat grid indices at time indices. """
+        grad_table = self._grad_table()
+        flat_grad = grad_table.reshape(grad_table.shape[0], -1)
+        cells = flat * len(self.time) + time_indices
+        return flat_grad[numpy.ix_(axes, cells)].T
+
+    def _value_table(self, t_idx : int) -> numpy.ndarray:
+        """ Return cached in-memory value function (N_1, ..., N_d) at time index. """
+        return self.interpolator_cache.get(('value', int(t_idx)),
+                lambda: numpy.asarray(self.value_function[..., int(t_idx)]))
+
+    def evaluate_trajectory(self,
+            states : numpy.ndarray,
+            times,
+            axes : typing.Optional[typing.List[int]] = None) -> numpy.ndarray:
+        """ Return minimal time to reach, membership, value and gradient of each row of states (N x d).
+
+            Note:
+                Vectorised counterpart of min_ttr, reach_at_t and gradient
+                per state, returned as structured array with fields ttr,
+                member, value and gradient (len(axes)). Times (N or scalar)
+                snap to the nearest time index, membership and value refer to
+                the reachable set at that time (times beyond the horizon are
+                not members). Rows outside of the grid are NaN and not members.
+        """
+        states = numpy.asarray(states, dtype=float).reshape(-1, len(self.grid.dx))
+        axes = numpy.arange(len(self.grid.dx)) if axes is None else numpy.asarray(axes)
+        times = numpy.broadcast_to(numpy.asarray(times, dtype=float), (len(states), ))
+        time_indices = self._nearest_time_indices(times, len(states))
+
+        result = numpy.zeros(len(states), dtype=[
+            ('ttr', 'f8'),
+            ('member', '?'),
+            ('value', 'f8'),
+            ('gradient', 'f8', (len(axes), ))])
+        result['ttr'] = numpy.nan
+        result['value'] = numpy.nan
+        result['gradient'] = numpy.nan
+
+        indices, mask = self.grid.index_batch(states)
+        rows = numpy.flatnonzero(mask)
+        indices = indices[mask]
+        flat = numpy.ravel_multi_index(tuple(indices.T), self.ttr.shape)
+        time_indices = time_indices[mask]
+
+        result['ttr'][rows] = numpy.take(self._ttr_table(), flat)
+        result['gradient'][rows] = self._gradient_at_cells(flat, time_indices, axes)
+
+        ## Gather per distinct time index (few along a trajectory)
+        within_horizon = times[mask] <= self.time[-1]
+        for time_index in numpy.unique(time_indices):
+            selected = time_indices == time_index
+            result['value'][rows[selected]] = numpy.take(
+                    self._value_table(time_index), flat[selected])
+            selected &= within_horizon
+            result['member'][rows[selected]] = self._subset_contains(
+                    time_index, indices[selected])
+
+        return result
+
     # def gradient_drone(self,
             # state: numpy.ndarray,
             # ttr : float,
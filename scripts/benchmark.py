@@ -6,7 +6,9 @@
 """
 
 
+import time
 import numpy
+import concurrent.futures
 
 
 import pylevel
@@ -15,6 +17,49 @@ import pylevel
 # FORCE_INITIALISATION = False
 FORCE_INITIALISATION = True
 EXEMPLIFY_DEBUG_VERBOSITY = True
+## Thread counts of the query throughput benchmark
+BENCHMARK_THREADS = [1, 2, 4, 8]
+## Queries per thread (point queries) and states per batch (batch queries)
+BENCHMARK_QUERIES = 2000
+BENCHMARK_BATCH_SIZE = 10000
+
+
+def benchmark_query_threads(wrapper):
+    """ Print query throughput of the wrapper and its query facade for 1 to N threads. """
+    query = wrapper.query()
+    rng = numpy.random.default_rng(0)
+    states = rng.uniform(wrapper.grid.x_min, wrapper.grid.x_max,
+                         size=(BENCHMARK_QUERIES, len(wrapper.grid.dx)))
+    batch = rng.uniform(wrapper.grid.x_min, wrapper.grid.x_max,
+                        size=(BENCHMARK_BATCH_SIZE, len(wrapper.grid.dx)))
+    ttr = wrapper.time[len(wrapper.time) // 2]
+
+    def points(source):
+        for state in states:
+            source.min_ttr(state.copy())
+            source.gradient(state.copy(), ttr, 0)
+
+    def batches(source):
+        for _ in range(BENCHMARK_QUERIES // 100):
+            source.min_ttr_batch(batch)
+
+    cases = [('wrapper point', points, wrapper, 2 * BENCHMARK_QUERIES),
+             ('query point', points, query, 2 * BENCHMARK_QUERIES),
+             ('query batch', batches, query,
+              BENCHMARK_QUERIES // 100 * BENCHMARK_BATCH_SIZE)]
+
+    print('{:<16} {:>8} {:>16} {:>10}'.format('Case', 'Threads', 'Lookups/s', 'Speedup'))
+    for label, run, source, lookups in cases:
+        reference = None
+        for threads in BENCHMARK_THREADS:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+                ti = time.time()
+                for future in [executor.submit(run, source) for _ in range(threads)]:
+                    future.result()
+                throughput = threads * lookups / (time.time() - ti)
+            reference = reference or throughput
+            print('{:<16} {:>8} {:>16.0f} {:>10.2f}'.format(
+                label, threads, throughput, throughput / reference))
 
 
 if __name__ == '__main__':
@@ -28,6 +73,9 @@ if __name__ == '__main__':
             debug_is_enabled=EXEMPLIFY_DEBUG_VERBOSITY,
             force_initialisation=FORCE_INITIALISATION)
 
+    ## Concurrent lookups of planner threads
+    benchmark_query_threads(wrapper)
+
     ## Time steps from final time tf to t0
     t_idx = list(wrapper.time)
     t_idx.reverse()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+""" Benchmark of hull computation on boundary cells of the sublevel sets.
+
+    Compares hulling all active states to hulling only boundary cells
+    (TimeSliceTask.boundary_only) for all time indices of the benchmark
+    datasets and checks that both yield the same hull vertices.
+
+"""
+
+
+import numpy
+
+
+import pylevel
+
+
+EXEMPLIFY_DEBUG_VERBOSITY = False
+## Datasets to benchmark
+LEVEL_SET_TYPES = [
+    pylevel.datasets.LevelSetExample.BenchmarkLowResLowHoriz,
+    pylevel.datasets.LevelSetExample.BenchmarkMediumResMediumHoriz,
+    pylevel.datasets.LevelSetExample.BenchmarkHighResMediumHoriz]
+## Stages of the time slice task up to the hull
+STAGES = ['boundary', 'indices', 'states', 'hull']
+
+
+def run(wrapper, boundary_only):
+    """ Return stage timings and results of all time indices. """
+    task = pylevel.initialisation.TimeSliceTask(
+            grid=wrapper.grid,
+            time=wrapper.time,
+            projections=wrapper.projections,
+            boundary_only=boundary_only)
+    timings = pylevel.initialisation.StageTimings()
+    value_function = pylevel.data.ReachableSetData(
+            grid=wrapper.grid, data_handle=wrapper.data_handle).at_all_time()
+    results = list(pylevel.initialisation.map_time_slices(
+            task, value_function, range(len(wrapper.time)), timings=timings))
+    return timings, results
+
+
+def same_vertices(a, b):
+    """ Return whether hull vertices agree as sets (up to float precision). """
+    a = set(map(tuple, numpy.round(a, 6)))
+    b = set(map(tuple, numpy.round(b, 6)))
+    return a == b
+
+
+if __name__ == '__main__':
+    print('{:<34} {:>10} {:>14} {:>14} {:>10} {:>8}'.format(
+        'Dataset', 'Points', 'All [s]', 'Boundary [s]', 'Speedup', 'Equal'))
+
+    for level_set_type in LEVEL_SET_TYPES:
+        wrapper = pylevel.wrapper.ReachableSetWrapper(
+                label="ExampleLevelSet",
+                path=pylevel.datasets.path[level_set_type],
+                debug_is_enabled=EXEMPLIFY_DEBUG_VERBOSITY)
+
+        all_timings, all_results = run(wrapper, boundary_only=False)
+        boundary_timings, boundary_results = run(wrapper, boundary_only=True)
+
+        points = sum(int(result.subset.sum()) for result in all_results)
+        all_time = sum(all_timings.seconds.get(stage, 0.0) for stage in STAGES)
+        boundary_time = sum(boundary_timings.seconds.get(stage, 0.0) for stage in STAGES)
+        equal = all(same_vertices(a.vertices[name], b.vertices[name])
+                    for a, b in zip(all_results, boundary_results)
+                    for name in a.vertices)
+
+        print('{:<34} {:>10} {:>14.3f} {:>14.3f} {:>10.1f} {:>8}'.format(
+            level_set_type.name, points, all_time, boundary_time,
+            all_time / boundary_time, str(equal)))
+        print('  all      :', all_timings)
+        print('  boundary :', boundary_timings)
+        wrapper.file_handle.close()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+""" Benchmark of convex hull rasterisation (hull_img) and point membership.
+
+    Compares the former per-pixel in_hull loop to the vectorised
+    points_in_hull used by hull_img for square images of increasing size.
+
+"""
+
+
+import time
+import numpy
+from scipy.spatial import ConvexHull
+
+
+import pylevel
+
+
+## Image side lengths in pixels
+IMAGE_SIZES = [50, 100, 200]
+## Points of the random hull
+HULL_POINTS = 30
+
+
+def legacy_in_hull(idx, hull):
+    """ Former pylevel.utilities.in_hull as reference. """
+    eqs = hull.equations
+    inside_eqs = []
+    for eq in eqs:
+        total = 0
+        for i, ind in enumerate(idx):
+            coeff = eq[i]
+            total += coeff * ind
+        inside_eqs.append(total < -eq[-1])
+    return numpy.all(numpy.array(inside_eqs))
+
+
+def legacy_hull_img(hull, w, h):
+    """ Former pylevel.utilities.hull_img as reference. """
+    grid_explicit = numpy.empty((w, h), dtype=object)
+    grid_explicit[:, :] = [[(i, j) for i in range(w)] for j in range(h)]
+    in_hull_vectorized = numpy.vectorize(lambda x: float(legacy_in_hull(x, hull)))
+    return in_hull_vectorized(grid_explicit.flatten()).reshape((w, h))
+
+
+if __name__ == '__main__':
+    print('{:>6} {:>14} {:>14} {:>10} {:>12}'.format(
+        'Size', 'Legacy [ms]', 'Current [ms]', 'Speedup', 'Mismatches'))
+
+    for size in IMAGE_SIZES:
+        hull = ConvexHull(numpy.random.uniform(0.1 * size, 0.9 * size, size=(HULL_POINTS, 2)))
+
+        ti = time.time()
+        legacy = legacy_hull_img(hull, size, size)
+        legacy_time = time.time() - ti
+
+        ti = time.time()
+        current = pylevel.utilities.hull_img(hull, size, size)
+        current_time = time.time() - ti
+
+        print('{:>6} {:>14.2f} {:>14.2f} {:>10.1f} {:>12}'.format(
+            size, legacy_time * 1e3, current_time * 1e3,
+            legacy_time / current_time, int((legacy != current).sum())))
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+""" Micro-benchmark of grid index computation (per-call latency).
+
+    Compares the former index path (division and Python round per
+    element, bounds check on the index tuple) to Grid.index_valid with
+    precomputed inverse grid steps, and to the flat batch index path.
+
+"""
+
+
+import time
+import numpy
+
+
+import pylevel
+
+
+EXEMPLIFY_DEBUG_VERBOSITY = False
+## Point queries per path
+QUERIES = 20000
+
+
+def legacy_index_valid(grid, x):
+    """ Former Grid.index_valid (without periodic mapping) as reference. """
+    index = (x.ravel() - grid.x_min) / grid.dx
+    index = tuple([(round(idx)) for idx in index])
+    if not grid._index_in_grid(index):
+        raise pylevel.error.IndexNotInGridError()
+    return index
+
+
+if __name__ == '__main__':
+    level_set_type = pylevel.datasets.LevelSetExample.Drone
+
+    wrapper = pylevel.wrapper.ReachableSetWrapper(
+            label="ExampleLevelSet",
+            path=pylevel.datasets.path[level_set_type],
+            debug_is_enabled=EXEMPLIFY_DEBUG_VERBOSITY)
+    grid = wrapper.grid
+
+    states = numpy.random.uniform(grid.x_min, grid.x_max, size=(QUERIES, len(grid.dx)))
+    states = grid._handle_periodic_batch(states)
+
+    ti = time.time()
+    for state in states:
+        legacy_index_valid(grid, state)
+    legacy = (time.time() - ti) / QUERIES
+
+    ti = time.time()
+    for state in states:
+        grid.index_valid(state)
+    current = (time.time() - ti) / QUERIES
+
+    ti = time.time()
+    for state in states:
+        grid.flat_index_valid(state)
+    flat = (time.time() - ti) / QUERIES
+
+    ti = time.time()
+    grid.flat_index_batch(states)
+    batch = (time.time() - ti) / QUERIES
+
+    print('{:<28} {:>14}'.format('Index path', 'Latency [us]'))
+    for label, latency in [('legacy index_valid', legacy),
+                           ('index_valid', current),
+                           ('flat_index_valid', flat),
+                           ('flat_index_batch (per row)', batch)]:
+        print('{:<28} {:>14.3f}'.format(label, latency * 1e6))
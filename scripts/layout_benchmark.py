@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+""" Benchmark of lookup table storage layouts (point read latency).
+
+    Stores min_ttr and grad of an initialised level set with each storage
+    layout and compression to a scratch HDF5 file and measures the latency
+    of random single cell reads as performed by min_ttr() and gradient().
+
+"""
+
+
+import os
+import time
+import h5py
+import numpy
+import tempfile
+
+
+import pylevel
+
+
+EXEMPLIFY_DEBUG_VERBOSITY = False
+## Random point reads per layout
+QUERIES = 2000
+## HDF5 chunk cache per dataset
+CHUNK_CACHE_BYTES = 2**20
+
+
+if __name__ == '__main__':
+    level_set_type = pylevel.datasets.LevelSetExample.Drone
+
+    wrapper = pylevel.wrapper.ReachableSetWrapper(
+            label="ExampleLevelSet",
+            path=pylevel.datasets.path[level_set_type],
+            debug_is_enabled=EXEMPLIFY_DEBUG_VERBOSITY)
+    min_ttr = wrapper.ttr[...]
+    grad = wrapper.grad[...]
+
+    indices = [tuple(index) for index in numpy.random.randint(
+            0, min_ttr.shape, size=(QUERIES, min_ttr.ndim))]
+    time_indices = numpy.random.randint(0, grad.shape[-1], size=QUERIES)
+
+    print('{:<12} {:<14} {:>12} {:>16} {:>16}'.format(
+        'Layout', 'Compression', 'Size [kB]', 'min_ttr [us]', 'grad [us]'))
+
+    for layout in pylevel.storage.StorageLayout:
+        for compression in pylevel.storage.Compression:
+            path = os.path.join(tempfile.mkdtemp(), 'tables.h5')
+            with h5py.File(path, mode='w') as file_handle:
+                file_handle.create_dataset(
+                        'min_ttr', data=min_ttr,
+                        **pylevel.storage.dataset_options(
+                            layout, compression, min_ttr.shape, min_ttr.itemsize))
+                file_handle.create_dataset(
+                        'grad', data=grad,
+                        **pylevel.storage.dataset_options(
+                            layout, compression, grad.shape, grad.itemsize,
+                            is_gradient=True))
+
+            with h5py.File(path, mode='r', rdcc_nbytes=CHUNK_CACHE_BYTES) as file_handle:
+                size = sum(file_handle[name].id.get_storage_size()
+                           for name in ('min_ttr', 'grad'))
+
+                dataset = file_handle['min_ttr']
+                ti = time.time()
+                for index in indices:
+                    dataset[index]
+                ttr_latency = (time.time() - ti) / QUERIES
+
+                dataset = file_handle['grad']
+                ti = time.time()
+                for index, time_index in zip(indices, time_indices):
+                    dataset[(0, ) + index + (time_index, )]
+                grad_latency = (time.time() - ti) / QUERIES
+
+            os.remove(path)
+            print('{:<12} {:<14} {:>12.1f} {:>16.1f} {:>16.1f}'.format(
+                layout.name, compression.name, size / 1e3,
+                ttr_latency * 1e6, grad_latency * 1e6))
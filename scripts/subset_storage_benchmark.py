@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+""" Benchmark of on-disk subset formats (size and read latency).
+
+    Stores all subsets of an initialised level set in each subset format
+    to a scratch HDF5 file and compares storage size, decode latency and
+    membership latency on the encoded form against the dense gzip layout.
+
+"""
+
+
+import os
+import time
+import h5py
+import numpy
+import tempfile
+
+
+import pylevel
+
+
+EXEMPLIFY_DEBUG_VERBOSITY = False
+## Repetitions per time index
+REPETITIONS = 20
+## Random grid indices per membership query
+QUERY_SIZE = 1000
+
+
+if __name__ == '__main__':
+    level_set_types = [
+            pylevel.datasets.LevelSetExample.Drone,
+            pylevel.datasets.LevelSetExample.DroneForesight]
+
+    for level_set_type in level_set_types:
+        wrapper = pylevel.wrapper.ReachableSetWrapper(
+                label="ExampleLevelSet",
+                path=pylevel.datasets.path[level_set_type],
+                debug_is_enabled=EXEMPLIFY_DEBUG_VERBOSITY)
+
+        subsets = {key: wrapper.reach_at_t_idx(int(key))
+                   for key in wrapper.group_subsets.keys()}
+        indices = numpy.random.randint(
+                0, wrapper.grid.N, size=(QUERY_SIZE, len(wrapper.grid.N)))
+
+        print('\n{} ({} subsets of shape {})'.format(
+            level_set_type.name, len(subsets), wrapper.grid.N))
+        print('{:<8} {:>12} {:>14} {:>18}'.format(
+            'Format', 'Size [kB]', 'Decode [ms]', 'Membership [ms]'))
+
+        for subset_format in pylevel.storage.SubsetFormat:
+            path = os.path.join(tempfile.mkdtemp(), 'subsets.h5')
+            with h5py.File(path, mode='w') as file_handle:
+                for key, subset in subsets.items():
+                    pylevel.storage.write_subset(file_handle, key, subset, subset_format)
+
+            with h5py.File(path, mode='r') as file_handle:
+                size = sum(file_handle[key].id.get_storage_size() for key in subsets)
+
+                ti = time.time()
+                for _ in range(REPETITIONS):
+                    for key in subsets:
+                        pylevel.storage.read_subset(file_handle[key])
+                decode = (time.time() - ti) / (REPETITIONS * len(subsets))
+
+                encoded = [pylevel.storage.read_encoded(file_handle[key]) for key in subsets]
+                ti = time.time()
+                for _ in range(REPETITIONS):
+                    for encoding in encoded:
+                        pylevel.storage.contains(*encoding, indices)
+                membership = (time.time() - ti) / (REPETITIONS * len(subsets))
+
+            os.remove(path)
+            print('{:<8} {:>12.1f} {:>14.3f} {:>18.3f}'.format(
+                subset_format.name, size / 1e3, decode * 1e3, membership * 1e3))
@@ -29,9 +29,7 @@ def convexified_reach_set(wrapper, state):
         v_index * np.ones(aug_dim)
     ))
     # convert from grid indices to states
-    reach_states = np.zeros(full_dim_reach_indices.shape)
-    for i, index in enumerate(full_dim_reach_indices):
-        reach_states[i, :] = reach.grid.state(index)
+    reach_states = reach.grid.states_from_indices(full_dim_reach_indices)
     reach_states_2D = np.hstack((
         reach_states[:, [0]],
         reach_states[:, [1]]
@@ -19,32 +19,26 @@ def viz_reachset(wrapper, state, show=True, show_timing=False, target_plt=None):
         ax.add_patch(target_plt)
     try:
         state[2] = radians(state[2])
-        _, _, yaw, v = wrapper.grid.index(state)
 
         times["ttr"] = time.time()
         ttr = wrapper.min_ttr(state)
         times["ttr"] = time.time() - times["ttr"]
 
         times["set"] = time.time()
-        curr_set = wrapper.reach_at_t(ttr)
+        set_sliced, extent = wrapper.reach_slice(ttr, fixed={2: state[2], 3: state[3]})
         times["set"] = time.time() - times["set"]
 
         times["grad"] = time.time()
-        grad_yaw = wrapper.gradient(state, ttr, 2)
-        grad_v = wrapper.gradient(state, ttr, 3)
+        grad_yaw, grad_v = wrapper.gradient_vector(state, ttr, axes=[2, 3])
         times["grad"] = time.time() - times["grad"]
 
         times["viz"] = time.time()
-        min_corner = wrapper.grid.x_min
-        max_corner = wrapper.grid.x_max
-        xy_extent = [min_corner[0], max_corner[0],
-                     max_corner[1], min_corner[1]]
+        xy_extent = [extent[0], extent[1], extent[3], extent[2]]
         plt.plot(state[0], state[1], 'ro')
         annotate_str = f'TTR: {ttr:.2f} [s], Grad: ({grad_yaw:.3f}, {grad_v:.3f})'
         plt.annotate(annotate_str,
                      (state[0]+0.1, state[1]+0.1),
                      color="gray")
-        set_sliced = curr_set[:, :, yaw, v]
         pylevel.utilities.visualize_XY(wrapper, set_sliced,
                                        ttr, show=show, cmap="Purples", alpha = 0.1,
                                        extent=xy_extent)
@@ -72,22 +66,15 @@ def viz_reachset(wrapper, state, show=True, show_timing=False, target_plt=None):
 def animate_reachset_evolution(wrapper, viz_heading, viz_vel, target_plt=None):
     """Applicaiton-specific, viz_heading in degrees, viz_vel in m/s"""
     t_idx = list(wrapper.time)
-    state_idx = wrapper.grid.index_valid(np.array([0, 0,
-                                                   radians(viz_heading),
-                                                   viz_vel]))
-    heading_idx = state_idx[2]
-    velocity_idx = state_idx[3]
-    min_corner = wrapper.grid.x_min
-    max_corner = wrapper.grid.x_max
-    xy_extent = [min_corner[0], max_corner[0],
-                 max_corner[1], min_corner[1]]
+    fixed = {2: radians(viz_heading), 3: viz_vel}
 
-    reachable_states = [wrapper.reach_at_t(t) for t in t_idx[:-1]]
+    ## Read only the XY slice of each time step
+    slices = [wrapper.reach_slice(t, fixed=fixed) for t in t_idx[:-1]]
     ax = plt.gca()
     if not target_plt is None:
         ax.add_patch(target_plt)
-    for reachable_states, t in zip(reachable_states,t_idx[:-1]):
-        states_sliced = reachable_states[:, :, heading_idx, velocity_idx]
+    for (states_sliced, extent), t in zip(slices, t_idx[:-1]):
+        xy_extent = [extent[0], extent[1], extent[3], extent[2]]
         pylevel.utilities.visualize_XY(wrapper, states_sliced,
                                        t, show=False, cmap="Purples", alpha = 0.1,
                                        extent=xy_extent)